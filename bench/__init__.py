@@ -0,0 +1 @@
+"""Benchmark suite (lihat bench/run.py)."""
@@ -0,0 +1,83 @@
+"""Generator data subscription untuk benchmark.
+
+Sebaran dibuat mirip data produksi:
+- expires_at: ~4% sudah expired (s/d 30 hari lalu), ~3% di window
+  reminder H-0..H-3, ~8% jatuh tempo 4..30 hari lagi, sisanya 1..24 bulan.
+- brand: ~40 brand dengan frekuensi Zipf (beberapa brand besar, ekor
+  panjang brand kecil), ~5% tanpa brand.
+- archive: default 8%, lebih sering di subscription yang sudah expired.
+
+Semua deterministik per seed supaya hasil antar versi bisa dibandingkan.
+"""
+import csv
+import io
+import random
+from datetime import date, datetime, timedelta
+from typing import Iterator
+
+from sqlalchemy import insert
+from sqlalchemy.engine import Engine
+
+from models import Subscription
+
+BRANDS = [f"BRAND{i:02d}" for i in range(1, 41)]
+_BRAND_WEIGHTS = [1 / (k ** 1.1) for k in range(1, len(BRANDS) + 1)]
+
+# (bobot, min days_left, max days_left)
+_EXPIRY_BUCKETS = [
+    (0.04, -30, -1),
+    (0.03, 0, 3),
+    (0.08, 4, 30),
+    (0.85, 31, 730),
+]
+
+
+def generate_rows(n: int, seed: int = 42, today: date | None = None, archived_ratio: float = 0.08) -> Iterator[dict]:
+    rnd = random.Random(seed)
+    today = today or date.today()
+    weights = [b[0] for b in _EXPIRY_BUCKETS]
+    now = datetime.utcnow()
+    for i in range(n):
+        _, lo, hi = rnd.choices(_EXPIRY_BUCKETS, weights)[0]
+        days_left = rnd.randint(lo, hi)
+        brand = None if rnd.random() < 0.05 else rnd.choices(BRANDS, _BRAND_WEIGHTS)[0]
+        # yang sudah expired 3x lebih mungkin diarsip
+        archived = rnd.random() < archived_ratio * (3 if days_left < 0 else 1)
+        yield {
+            "name": f"site-{i:07d}",
+            "url": f"https://site-{i:07d}.example.com",
+            "brand": brand,
+            "expires_at": today + timedelta(days=days_left),
+            "is_archived": archived,
+            "created_at": now,
+        }
+
+
+def load(engine: Engine, n: int, seed: int = 42, batch_size: int = 5000, **kw) -> int:
+    """Insert n subscription per batch (executemany); return jumlah baris."""
+    rows = generate_rows(n, seed, **kw)
+    total = 0
+    with engine.begin() as conn:
+        while True:
+            batch = [r for _, r in zip(range(batch_size), rows)]
+            if not batch:
+                break
+            conn.execute(insert(Subscription), batch)
+            total += len(batch)
+    return total
+
+
+def to_csv(rows, with_id_from: int | None = None) -> bytes:
+    """CSV format /import (tanggal mm/dd/yyyy). with_id_from: isi kolom id
+    berurutan mulai dari angka ini (untuk benchmark upsert)."""
+    out = io.StringIO()
+    w = csv.writer(out)
+    w.writerow(["id", "name", "url", "brand", "expires_at", "is_archived"])
+    for i, r in enumerate(rows):
+        w.writerow([
+            "" if with_id_from is None else with_id_from + i,
+            r["name"], r["url"], r["brand"] or "",
+            r["expires_at"].strftime("%m/%d/%Y"),
+            "1" if r["is_archived"] else "0",
+        ])
+    return out.getvalue().encode()
@@ -0,0 +1,101 @@
+"""Mock Telegram Bot API (cuma sendMessage) untuk benchmark.
+
+Jalan sendiri:   python -m bench.mock_telegram --port 8081 --latency 0.05
+lalu arahkan app ke sini dengan TELEGRAM_API_BASE=http://127.0.0.1:8081
+"""
+import argparse
+import asyncio
+import json
+import threading
+import time
+from collections import Counter
+
+import uvicorn
+
+
+class MockTelegram:
+    """ASGI app minimal: POST /bot<token>/sendMessage -> {"ok": true}."""
+
+    def __init__(self, latency: float = 0.0, rate_limit_every: int = 0):
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every   # tiap N pesan balas 429 sekali
+        self.requests = 0
+        self.sent = 0
+        self.bytes = 0
+        self.throttled = 0
+        self.chats: Counter = Counter()
+
+    def reset(self):
+        self.requests = self.sent = self.bytes = self.throttled = 0
+        self.chats.clear()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return
+
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+
+        if scope["method"] != "POST" or not scope["path"].endswith("/sendMessage"):
+            return await self._reply(send, 404, {"ok": False, "error_code": 404, "description": "Not Found"})
+
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            return await self._reply(send, 400, {"ok": False, "error_code": 400, "description": "Bad Request"})
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.requests += 1
+        if self.rate_limit_every and self.requests % self.rate_limit_every == 0:
+            self.throttled += 1
+            return await self._reply(send, 429, {
+                "ok": False, "error_code": 429, "description": "Too Many Requests: retry after 1",
+                "parameters": {"retry_after": 1},
+            })
+
+        self.sent += 1
+        self.bytes += len(payload.get("text", ""))
+        self.chats[str(payload.get("chat_id"))] += 1
+        await self._reply(send, 200, {"ok": True, "result": {"message_id": self.sent, "date": int(time.time())}})
+
+    @staticmethod
+    async def _reply(send, status: int, data: dict):
+        raw = json.dumps(data).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(raw)).encode())],
+        })
+        await send({"type": "http.response.body", "body": raw})
+
+
+def serve_in_thread(app: MockTelegram, host: str = "127.0.0.1", port: int = 0) -> tuple[uvicorn.Server, str]:
+    """Start mock di thread daemon; return (server, base_url)."""
+    config = uvicorn.Config(app, host=host, port=port, log_level="warning", lifespan="off")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, name="mock-telegram", daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    bound_port = server.servers[0].sockets[0].getsockname()[1]
+    return server, f"http://{host}:{bound_port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock Telegram sendMessage")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0, help="detik per request")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="balas 429 tiap N pesan")
+    args = parser.parse_args()
+    uvicorn.run(MockTelegram(args.latency, args.rate_limit_every), host=args.host, port=args.port,
+                log_level="info", lifespan="off")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+"""Benchmark hot path RDR Hosting Reminder.
+
+Contoh:
+    python -m bench.run --sizes 10000 --out bench_results.json      # SQLite lokal
+    python -m bench.run --database-url postgresql://localhost/rdr_bench \\
+        --sizes 10000,100000 --out bench_results.json
+    python -m bench.run --database-url ... --compare bench_results.json
+
+PERINGATAN: database di --database-url DIKOSONGKAN tiap ukuran data.
+Sengaja tidak membaca DATABASE_URL supaya tidak pernah kena DB produksi;
+default-nya file SQLite bench/bench.db (tidak perlu server).
+
+Yang diukur (tiap ukuran data, --repeat kali, in-process lewat TestClient):
+- root: render dashboard cold (cache di-invalidate), warm (page cache), 304
+- reminder stage H-3 / H-2 / H-1/EXPIRED (run_reminder_stages) dan full
+  list (send_full_list_trigger), kirim ke mock Telegram lokal
+- /export csv dan jsonl+gzip, /import upsert (pakai id) dan insert
+- bulk renew/archive by id, bulk by filter, bulk delete
+
+Rate limit Telegram (1 pesan/detik per chat) dinaikkan supaya yang
+terukur adalah app, bukan batas Telegram; pakai --respect-rate-limits
+untuk memakai setting env apa adanya.
+
+Output JSON: {"meta": {...}, "results": [{name, size, runs_s, median_s, ...}]}
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+from bench.mock_telegram import MockTelegram, serve_in_thread
+
+
+def _git_rev() -> str | None:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+def _configure_env(args, telegram_base: str):
+    # harus sebelum import modul app (env dibaca saat import)
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ["TELEGRAM_API_BASE"] = telegram_base
+    os.environ["TELEGRAM_BOT_TOKEN"] = "bench"
+    os.environ["TELEGRAM_CHAT_ID"] = "1001"
+    os.environ.setdefault("SESSION_SECRET", "bench")
+    if not args.respect_rate_limits:
+        os.environ["TELEGRAM_RATE_GLOBAL"] = "100000"
+        os.environ["TELEGRAM_RATE_CHAT"] = "100000"
+        os.environ["TELEGRAM_RATE_GROUP_PER_MIN"] = "6000000"
+
+
+class Bench:
+    def __init__(self, size: int, repeat: int):
+        self.size = size
+        self.repeat = repeat
+        self.results: list[dict] = []
+
+    def run(self, name: str, fn, setup=None, repeat: int | None = None) -> dict:
+        runs, extra = [], {}
+        for _ in range(repeat or self.repeat):
+            if setup:
+                setup()
+            t0 = time.perf_counter()
+            extra = fn() or {}
+            runs.append(time.perf_counter() - t0)
+        res = {
+            "name": name,
+            "size": self.size,
+            "runs_s": [round(r, 6) for r in runs],
+            "min_s": round(min(runs), 6),
+            "median_s": round(statistics.median(runs), 6),
+            "max_s": round(max(runs), 6),
+            **extra,
+        }
+        self.results.append(res)
+        print(f"  {name:<28} median {res['median_s'] * 1000:10.1f} ms  {extra}", file=sys.stderr)
+        return res
+
+
+def _reset_db():
+    from database import Base, engine
+    from migrations import schema_version
+    Base.metadata.drop_all(engine)
+    schema_version.drop(engine, checkfirst=True)
+
+
+async def run_reminder_stages(stages: list[str]):
+    """Satu stage reminder penuh (query window + kirim + mark_notified) tanpa
+    ReminderEngine, supaya tiap stage bisa diukur terpisah."""
+    from crud_async import get_due_subscriptions
+    from database import AsyncSessionLocal
+    from telegram_bot import REMINDER_STAGES, _send_stage, _to_date, timezone_wib
+
+    async with AsyncSessionLocal() as db:
+        now_dt = datetime.now(timezone_wib)
+        today = now_dt.date()
+        now_str = now_dt.strftime("%d %B %Y - %H:%M WIB")
+
+        all_days = [d for stage in stages for d in REMINDER_STAGES[stage][0]]
+        subs = await get_due_subscriptions(
+            db, today + timedelta(days=min(all_days)), today + timedelta(days=max(all_days)),
+        )
+        for stage in stages:
+            target_days = REMINDER_STAGES[stage][0]
+            matched = []
+            for sub in subs:
+                exp_date = _to_date(sub.expires_at)
+                days_left = (exp_date - today).days
+                if days_left in target_days:
+                    matched.append((sub, exp_date, days_left))
+            await _send_stage(db, stage, matched, now_str)
+
+
+def run_size(size: int, args, mock: MockTelegram) -> list[dict]:
+    from fastapi.testclient import TestClient
+
+    import crud
+    import main
+    from bench import datagen
+    from cache import data_version
+    from database import async_engine, engine
+    from metrics import JOB_LAST_MATCHED
+    from telegram_bot import REMINDER_STAGES, send_full_list_trigger
+
+    print(f"[bench] size={size}", file=sys.stderr)
+    _reset_db()
+    b = Bench(size, args.repeat)
+    json_hdr = {"Accept": "application/json"}
+
+    with TestClient(main.app) as client:
+        # scheduler/engine jangan ikut jalan selama pengukuran
+        client.portal.call(main.stop_jobs)
+        client.post("/login", data={
+            "username": os.getenv("ADMIN_USERNAME", "adminrdr"),
+            "password": os.getenv("ADMIN_PASSWORD", "j3las_kuat39!"),
+        })
+
+        b.run("datagen_load", lambda: {"rows": datagen.load(engine, size, seed=args.seed)}, repeat=1)
+        crud.emit_change("subscription", None)
+
+        # ---------- dashboard ----------
+        def get_root(headers=None):
+            r = client.get("/", headers=headers or {})
+            assert r.status_code in (200, 304), r.status_code
+            return {"status": r.status_code, "bytes": len(r.content)}
+
+        b.run("root_cold", get_root, setup=lambda: data_version.bump("subscription"))
+        get_root()
+        b.run("root_warm", get_root)
+        etag = client.get("/").headers.get("etag")
+        b.run("root_304", lambda: get_root({"If-None-Match": etag}))
+
+        # ---------- reminder / full list ----------
+        def stage_fn(stage):
+            def fn():
+                client.portal.call(run_reminder_stages, [stage])
+                matched = JOB_LAST_MATCHED._values.get((stage,), 0)
+                return {"matched": matched, "messages": mock.sent}
+            return fn
+
+        for stage in REMINDER_STAGES:
+            b.run(f"reminder_{stage}", stage_fn(stage), setup=mock.reset)
+
+        def full_list():
+            client.portal.call(send_full_list_trigger, "BENCH")
+            return {"messages": mock.sent, "text_bytes": mock.bytes}
+
+        b.run("full_list", full_list, setup=mock.reset)
+
+        # ---------- export ----------
+        def export(params):
+            def fn():
+                r = client.get("/export", params=params)
+                assert r.status_code == 200, r.status_code
+                return {"bytes": len(r.content)}
+            return fn
+
+        b.run("export_csv", export({}))
+        b.run("export_jsonl_gz", export({"format": "jsonl", "gzip": "true"}))
+
+        # ---------- import ----------
+        n_import = min(args.import_rows, size)
+        upsert_csv = datagen.to_csv(datagen.generate_rows(n_import, seed=args.seed + 1), with_id_from=1)
+        insert_csv = datagen.to_csv(datagen.generate_rows(n_import, seed=args.seed + 2))
+
+        def do_import(payload):
+            def fn():
+                r = client.post("/import", files={"file": ("bench.csv", payload, "text/csv")}, headers=json_hdr)
+                assert r.status_code == 200, r.text
+                rep = r.json()
+                return {"rows": rep["rows"], "inserted": rep["inserted"], "updated": rep["updated"],
+                        "errors": rep["error_count"]}
+            return fn
+
+        b.run("import_upsert", do_import(upsert_csv))
+        b.run("import_insert", do_import(insert_csv), repeat=1)
+
+        # ---------- bulk ----------
+        ids = [str(i) for i in range(1, min(args.bulk_ids, size) + 1)]
+
+        def post_json(url, **kw):
+            def fn():
+                r = client.post(url, headers=json_hdr, **kw)
+                assert r.status_code == 200, r.text
+                return {"affected": r.json()["affected"]}
+            return fn
+
+        today = date.today()
+        window = {"start": today.isoformat(), "end": (today + timedelta(days=365)).isoformat()}
+        b.run("bulk_renew_ids", post_json("/bulk/renew/1", data={"ids": ids}))
+        b.run("bulk_archive_ids", post_json("/bulk/archive", data={"ids": ids}))
+        b.run("bulk_filter_unarchive", post_json("/bulk/by-filter/unarchive", params={"brand": "BRAND01"}))
+        b.run("bulk_filter_renew", post_json("/bulk/by-filter/renew", params={"brand": "BRAND01", "days": 1, **window}))
+        b.run("bulk_delete_ids", post_json("/bulk/delete", data={"ids": ids}), repeat=1)
+
+    # koneksi async terikat ke event loop TestClient yang sudah selesai
+    async_engine.sync_engine.dispose(close=False)
+    return b.results
+
+
+def compare(old_path: str, results: list[dict], threshold: float) -> bool:
+    with open(old_path) as f:
+        old = {(r["name"], r["size"]): r["median_s"] for r in json.load(f)["results"]}
+    regressed = False
+    print(f"\n{'benchmark':<28}{'size':>10}{'old ms':>12}{'new ms':>12}{'ratio':>8}", file=sys.stderr)
+    for r in results:
+        prev = old.get((r["name"], r["size"]))
+        if not prev:
+            continue
+        ratio = r["median_s"] / prev if prev else float("inf")
+        flag = "  <-- regresi" if ratio > threshold else ""
+        regressed |= ratio > threshold
+        print(f"{r['name']:<28}{r['size']:>10}{prev * 1000:>12.1f}{r['median_s'] * 1000:>12.1f}{ratio:>8.2f}{flag}",
+              file=sys.stderr)
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark RDR Hosting Reminder")
+    parser.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL", "sqlite:///bench/bench.db"),
+                        help="DB khusus benchmark (akan dikosongkan!)")
+    parser.add_argument("--sizes", default="10000", help="jumlah subscription, pisah koma")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--import-rows", type=int, default=10000)
+    parser.add_argument("--bulk-ids", type=int, default=1000)
+    parser.add_argument("--telegram-latency", type=float, default=0.0, help="latency mock sendMessage (detik)")
+    parser.add_argument("--respect-rate-limits", action="store_true")
+    parser.add_argument("--out", help="tulis hasil JSON ke file (default stdout)")
+    parser.add_argument("--compare", help="hasil JSON lama untuk dibandingkan")
+    parser.add_argument("--threshold", type=float, default=1.2, help="rasio median yang dianggap regresi")
+    args = parser.parse_args()
+
+    mock = MockTelegram(latency=args.telegram_latency)
+    server, base_url = serve_in_thread(mock)
+    _configure_env(args, base_url)
+
+    from database import engine
+    started = datetime.utcnow()
+    results = []
+    try:
+        for size in (int(s) for s in args.sizes.split(",") if s.strip()):
+            results += run_size(size, args, mock)
+    finally:
+        server.should_exit = True
+
+    report = {
+        "meta": {
+            "started_at": started.isoformat() + "Z",
+            "git_rev": _git_rev(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "dialect": engine.dialect.name,
+            "repeat": args.repeat,
+            "seed": args.seed,
+            "telegram_latency_s": args.telegram_latency,
+            "respect_rate_limits": args.respect_rate_limits,
+        },
+        "results": results,
+    }
+    out = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(out + "\n")
+    else:
+        print(out)
+
+    if args.compare and compare(args.compare, results, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Cache in-process yang di-invalidate lewat crud.on_change.
+
+Setiap mutasi di crud.py menaikkan versi tabelnya; key cache memakai versi
+tersebut (plus tanggal WIB) sehingga entry lama otomatis tidak terpakai.
+Perubahan dari worker lain ikut masuk lewat ChangeBus (cluster.py).
+"""
+import hashlib
+import math
+import secrets
+import time
+from collections import defaultdict
+from typing import Callable, Hashable
+
+import crud
+
+
+class DataVersion:
+    def __init__(self):
+        self._counters: dict[str, int] = defaultdict(int)
+        self._changed_at: dict[str, float] = {}
+        # counter mulai dari 0 tiap proses; epoch membedakan ETag antar worker/restart
+        self.epoch = secrets.token_hex(4)
+
+    def bump(self, table: str, ids: list[int] | None = None):
+        self._counters[table] += 1
+        self._changed_at[table] = time.monotonic()
+
+    def get(self, *tables: str) -> tuple[int, ...]:
+        return tuple(self._counters[t] for t in tables)
+
+    def age(self, *tables: str) -> float:
+        """Detik sejak perubahan terakhir di salah satu tabel (inf = belum pernah)."""
+        last = max((self._changed_at.get(t, -math.inf) for t in tables), default=-math.inf)
+        return time.monotonic() - last
+
+    def etag(self, *parts) -> str:
+        digest = hashlib.sha1(repr((self.epoch, parts)).encode()).hexdigest()[:20]
+        return f'"{digest}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return any(t.removeprefix("W/") == etag for t in tags)
+
+
+class KeyedCache:
+    """Simpan nilai untuk beberapa key terakhir saja (key = versi data).
+
+    group(key): entry dengan group yang sama saling menggantikan. Versi data
+    hanya naik, jadi entry lama satu group tidak akan pernah kena hit lagi.
+    """
+
+    def __init__(self, maxsize: int = 1, group: Callable[[Hashable], Hashable] | None = None):
+        self.maxsize = maxsize
+        self.group = group
+        self._data: dict = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        if key in self._data:
+            self.hits += 1
+            return self._data[key]
+        self.misses += 1
+        return None
+
+    def set(self, key, value):
+        self._data.pop(key, None)
+        if self.group is not None:
+            g = self.group(key)
+            for old in [k for k in self._data if self.group(k) == g]:
+                del self._data[old]
+        self._data[key] = value
+        while len(self._data) > self.maxsize:
+            self._data.pop(next(iter(self._data)))
+        return value
+
+    def stats(self) -> dict:
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+data_version = DataVersion()
+crud.on_change(data_version.bump)
+
+dashboard_stats_cache = KeyedCache()
+# halaman dashboard yang sudah di-render: hanya versi terbaru per user
+# (key = (versi, tanggal, username))
+page_cache = KeyedCache(maxsize=8, group=lambda key: key[-1])
@@ -0,0 +1,316 @@
+"""Koordinasi antar worker / replica lewat database.
+
+- LeaderElector: hanya proses yang memegang lock yang menjalankan job
+  reminder. Postgres: advisory lock yang menempel di satu koneksi; kalau
+  proses/koneksi mati, Postgres melepas lock dan worker lain mengambil
+  alih. SQLite: flock() pada file <db>.leader.lock di sebelah file
+  database; dilepas OS kalau proses mati.
+- ChangeBus: event crud.on_change diteruskan ke worker lain, supaya engine
+  reminder di leader (dan cache per worker) tetap tahu perubahan yang
+  terjadi di worker lain. Postgres: LISTEN/NOTIFY. SQLite: tabel
+  change_event yang di-poll tiap CHANGE_POLL_INTERVAL detik.
+
+Backend lain (dan SQLite in-memory) dianggap satu proses: proses ini
+selalu jadi leader dan change bus tidak aktif.
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, IO
+
+try:
+    import fcntl
+except ImportError:   # Windows
+    fcntl = None
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+import crud
+
+logger = logging.getLogger(__name__)
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+CHANGE_CHANNEL = "rdr_changes"
+# payload NOTIFY dibatasi ~8000 byte; lebih dari ini kirim ids=None (reload penuh)
+_MAX_NOTIFY_IDS = 500
+CHANGE_POLL_INTERVAL = float(os.getenv("CHANGE_POLL_INTERVAL", "1"))
+# event lebih tua dari ini sudah dibaca semua worker yang hidup
+CHANGE_RETENTION = timedelta(minutes=10)
+
+
+def is_postgres(engine: AsyncEngine) -> bool:
+    return engine.dialect.name == "postgresql"
+
+
+def sqlite_path(engine: AsyncEngine) -> str | None:
+    """Path file database SQLite; None untuk backend lain / in-memory."""
+    if engine.dialect.name != "sqlite":
+        return None
+    database = engine.url.database
+    if not database or database == ":memory:" or database.startswith("file::memory:"):
+        return None
+    return os.path.abspath(database)
+
+
+class LeaderElector:
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        on_elected: Callable[[], Awaitable[None]],
+        on_demoted: Callable[[], Awaitable[None]],
+        lock_key: int = 0x52445201,
+        retry_interval: float = 15,
+        check_interval: float = 10,
+        on_heartbeat: Callable[[], Awaitable[None]] | None = None,
+    ):
+        self.engine = engine
+        self.lock_key = lock_key
+        self.retry_interval = retry_interval
+        self.check_interval = check_interval
+        self._on_elected = on_elected
+        self._on_demoted = on_demoted
+        self._on_heartbeat = on_heartbeat
+        self._conn: AsyncConnection | None = None
+        self._lock_file: IO | None = None
+        self._task: asyncio.Task | None = None
+        self.is_leader = False
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="leader-elector")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self._step_down(release=True)
+
+    def stats(self) -> dict:
+        return {"worker": WORKER_ID, "is_leader": self.is_leader}
+
+    def _try_file_lock(self, db_path: str) -> bool:
+        # SQLite: semua worker di host yang sama berbagi file database,
+        # jadi flock di sebelahnya berlaku untuk semua worker
+        if fcntl is None:
+            logger.warning("[LEADER] fcntl tidak ada, jalankan SQLite dengan satu worker saja")
+            return True
+        f = open(f"{db_path}.leader.lock", "a")
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        self._lock_file = f
+        return True
+
+    async def _try_acquire(self) -> bool:
+        if not is_postgres(self.engine):
+            db_path = sqlite_path(self.engine)
+            return self._try_file_lock(db_path) if db_path else True
+        conn = await self.engine.connect()
+        try:
+            # autocommit: koneksi pemegang lock tidak boleh "idle in transaction"
+            await conn.execution_options(isolation_level="AUTOCOMMIT")
+            got = (await conn.execute(
+                text("SELECT pg_try_advisory_lock(:k)"), {"k": self.lock_key}
+            )).scalar()
+        except Exception:
+            await conn.close()
+            raise
+        if not got:
+            await conn.close()
+            return False
+        self._conn = conn
+        return True
+
+    async def _still_leader(self) -> bool:
+        if self._conn is None:
+            return True   # non-Postgres (flock tetap dipegang selama file terbuka)
+        try:
+            await self._conn.execute(text("SELECT 1"))
+            return True
+        except Exception as e:
+            logger.error(f"[LEADER] koneksi lock putus: {e}")
+            return False
+
+    async def _step_down(self, release: bool = False):
+        was_leader = self.is_leader
+        self.is_leader = False
+        if was_leader:
+            try:
+                await self._on_demoted()
+            except Exception as e:
+                logger.error(f"[LEADER] on_demoted error: {e}")
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            try:
+                if release:
+                    await conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": self.lock_key})
+                await conn.close()
+            except Exception:
+                # koneksi rusak: buang dari pool, lock ikut lepas di server
+                await conn.invalidate()
+                await conn.close()
+        if self._lock_file is not None:
+            f, self._lock_file = self._lock_file, None
+            f.close()   # menutup fd melepas flock
+        if was_leader:
+            logger.info(f"[LEADER] {WORKER_ID} lepas leader")
+
+    async def _run(self):
+        while True:
+            try:
+                if not self.is_leader:
+                    if await self._try_acquire():
+                        self.is_leader = True
+                        logger.info(f"[LEADER] {WORKER_ID} jadi leader ✅")
+                        await self._on_elected()
+                    else:
+                        await asyncio.sleep(self.retry_interval)
+                        continue
+                elif not await self._still_leader():
+                    await self._step_down()
+                    continue
+
+                if self._on_heartbeat is not None:
+                    await self._on_heartbeat()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[LEADER] error: {e}")
+                await self._step_down()
+                await asyncio.sleep(self.retry_interval)
+                continue
+            await asyncio.sleep(self.check_interval)
+
+
+class ChangeBus:
+    def __init__(self, engine: AsyncEngine, channel: str = CHANGE_CHANNEL):
+        self.engine = engine
+        self.channel = channel
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._task: asyncio.Task | None = None
+        self._pending: set[asyncio.Task] = set()
+        self._replaying = False
+        crud.on_change(self.publish)
+
+    @property
+    def enabled(self) -> bool:
+        return is_postgres(self.engine) or sqlite_path(self.engine) is not None
+
+    def start(self):
+        if not self.enabled or self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        run = self._listen() if is_postgres(self.engine) else self._poll()
+        self._task = asyncio.create_task(run, name="change-bus")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, *self._pending, return_exceptions=True)
+            self._task = None
+        self._loop = None
+
+    # ---------- publish (listener crud.on_change) ----------
+    def publish(self, table: str, ids: list[int] | None):
+        if self._replaying or self._loop is None:
+            return   # event dari worker lain jangan di-broadcast ulang
+        if ids is not None and len(ids) > _MAX_NOTIFY_IDS:
+            ids = None
+        payload = json.dumps({"w": WORKER_ID, "t": table, "ids": ids})
+        self._loop.call_soon_threadsafe(self._spawn_publish, payload)
+
+    def _spawn_publish(self, payload: str):
+        task = asyncio.create_task(self._publish(payload))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _publish(self, payload: str):
+        try:
+            async with self.engine.connect() as conn:
+                if is_postgres(self.engine):
+                    await conn.execute(
+                        text("SELECT pg_notify(:c, :p)"), {"c": self.channel, "p": payload}
+                    )
+                else:
+                    await conn.execute(
+                        text("INSERT INTO change_event (worker, payload, created_at) VALUES (:w, :p, :t)"),
+                        {"w": WORKER_ID, "p": payload, "t": datetime.utcnow()},
+                    )
+                await conn.commit()
+        except Exception as e:
+            logger.error(f"[BUS] publish error: {e}")
+
+    # ---------- listen ----------
+    def _apply(self, payload: str):
+        try:
+            msg = json.loads(payload)
+        except ValueError:
+            return
+        if msg.get("w") == WORKER_ID:
+            return
+        self._replaying = True
+        try:
+            crud.emit_change(msg.get("t"), msg.get("ids"))
+        finally:
+            self._replaying = False
+
+    async def _listen(self):
+        reconnect = False
+        while True:
+            try:
+                async with self.engine.connect() as conn:
+                    await conn.execution_options(isolation_level="AUTOCOMMIT")
+                    await conn.execute(text(f"LISTEN {self.channel}"))
+                    raw = await conn.get_raw_connection()
+                    logger.info(f"[BUS] listen {self.channel}")
+                    if reconnect:
+                        # notifikasi selama putus hilang -> minta listener reload penuh
+                        self._apply(json.dumps({"w": None, "t": "subscription", "ids": None}))
+                    reconnect = True
+                    async for notify in raw.driver_connection.notifies():
+                        self._apply(notify.payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[BUS] listen error: {e}")
+                await asyncio.sleep(5)
+
+    async def _poll(self):
+        # SQLite tidak punya LISTEN/NOTIFY: baca event baru dari change_event
+        last_id: int | None = None
+        last_prune = 0.0
+        while True:
+            try:
+                async with self.engine.connect() as conn:
+                    if last_id is None:
+                        last_id = (await conn.execute(
+                            text("SELECT COALESCE(MAX(id), 0) FROM change_event")
+                        )).scalar()
+                        logger.info(f"[BUS] poll change_event tiap {CHANGE_POLL_INTERVAL}s")
+                    rows = (await conn.execute(
+                        text("SELECT id, payload FROM change_event WHERE id > :last ORDER BY id"),
+                        {"last": last_id},
+                    )).all()
+                    now = asyncio.get_running_loop().time()
+                    if now - last_prune > CHANGE_RETENTION.total_seconds() / 2:
+                        await conn.execute(
+                            text("DELETE FROM change_event WHERE created_at < :cutoff"),
+                            {"cutoff": datetime.utcnow() - CHANGE_RETENTION},
+                        )
+                        await conn.commit()
+                        last_prune = now
+                for row_id, payload in rows:
+                    self._apply(payload)
+                    last_id = row_id
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[BUS] poll error: {e}")
+            await asyncio.sleep(CHANGE_POLL_INTERVAL)
@@ -1,8 +1,32 @@
+import logging
+from typing import Callable
+
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
-from models import Subscription, LogEntry
+from sqlalchemy import desc, case, func, and_, or_, literal_column, select, insert, update, delete, text
+from models import Subscription, LogEntry, LogDaily, JobHeartbeat, OutboxMessage
 from schemas import SubscriptionCreate
-from datetime import datetime
+from datetime import date, datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+
+# ========== Change hooks ==========
+# listener(table, ids): dipanggil setelah commit mutasi. ids=None berarti
+# "tidak tahu baris mana" (mis. bulk by filter) -> listener reload penuh.
+_change_listeners: list[Callable[[str, list[int] | None], None]] = []
+
+
+def on_change(listener: Callable[[str, list[int] | None], None]):
+    _change_listeners.append(listener)
+    return listener
+
+
+def emit_change(table: str, ids: list[int] | None = None):
+    for listener in list(_change_listeners):
+        try:
+            listener(table, ids)
+        except Exception as e:
+            logger.error(f"[CRUD] change listener error: {e}")
 
 
 # ========== Subscription ==========
@@ -24,6 +48,16 @@ def get_archived_subscriptions(db: Session):
     )
 
 
+def get_subscription(db: Session, sub_id: int):
+    return db.query(Subscription).filter(Subscription.id == sub_id).first()
+
+
+def get_subscriptions_by_ids(db: Session, ids: list[int]):
+    if not ids:
+        return []
+    return db.query(Subscription).filter(Subscription.id.in_(ids)).all()
+
+
 def get_all_subscriptions(db: Session, include_archived: bool = False):
     q = db.query(Subscription)
     if not include_archived:
@@ -31,11 +65,175 @@ def get_all_subscriptions(db: Session, include_archived: bool = False):
     return q.all()
 
 
+EXPORT_COLUMNS = ("id", "name", "url", "brand", "expires_at", "is_archived")
+
+
+def export_query(include_archived: bool = True):
+    """SELECT kolom export (tanpa ORM object), urut id supaya stabil."""
+    stmt = select(*(getattr(Subscription, c) for c in EXPORT_COLUMNS)).order_by(Subscription.id)
+    if not include_archived:
+        stmt = stmt.where(Subscription.is_archived == False)
+    return stmt
+
+
+def get_due_subscriptions(db: Session, start: date, end: date):
+    """Subscription aktif dengan expires_at di rentang [start, end] (inklusif)."""
+    return (
+        db.query(Subscription)
+        .filter(
+            Subscription.is_archived == False,
+            Subscription.expires_at >= start,
+            Subscription.expires_at <= end,
+        )
+        .order_by(Subscription.expires_at.asc(), Subscription.id.asc())
+        .all()
+    )
+
+
+# status dashboard -> (offset awal, offset akhir) hari dari today; None = terbuka
+STATUS_WINDOWS = {
+    "all": (None, None),
+    "expired": (None, -1),
+    "h1": (0, 1),
+    "h2": (2, 2),
+    "h3": (3, 3),
+    "soon": (4, 7),
+    "safe": (8, None),
+}
+
+
+def status_window(status: str, today: date) -> tuple[date | None, date | None]:
+    start, end = STATUS_WINDOWS[status]
+    return (
+        today + timedelta(days=start) if start is not None else None,
+        today + timedelta(days=end) if end is not None else None,
+    )
+
+
+def brand_key(brand: str | None) -> str:
+    """Key grup brand: kosong / spasi saja = "TANPA BRAND". Dipakai dashboard,
+    Telegram dan destinations; brand_key_expr() adalah versi SQL-nya."""
+    return ((brand or "").strip() or "Tanpa Brand").upper()
+
+
+def brand_key_expr():
+    # aturan sama persis dengan brand_key()
+    return func.upper(func.coalesce(func.nullif(func.trim(Subscription.brand), ""), "Tanpa Brand"))
+
+
+def get_subscriptions_page(
+    db: Session,
+    limit: int,
+    after: tuple[date, int] | None = None,
+    start: date | None = None,
+    end: date | None = None,
+    brand: str | None = None,
+    archived: bool = False,
+):
+    """Keyset pagination urut (expires_at, id). Return limit+1 baris maksimal
+    supaya caller tahu masih ada halaman berikutnya."""
+    q = db.query(Subscription).filter(Subscription.is_archived == archived)
+    if start is not None:
+        q = q.filter(Subscription.expires_at >= start)
+    if end is not None:
+        q = q.filter(Subscription.expires_at <= end)
+    if brand:
+        q = q.filter(brand_key_expr() == brand.strip().upper())
+    if after is not None:
+        after_exp, after_id = after
+        q = q.filter(
+            Subscription.expires_at >= after_exp,
+            or_(
+                Subscription.expires_at > after_exp,
+                and_(Subscription.expires_at == after_exp, Subscription.id > after_id),
+            ),
+        )
+    return (
+        q.order_by(Subscription.expires_at.asc(), Subscription.id.asc())
+        .limit(limit + 1)
+        .all()
+    )
+
+
+def get_dashboard_stats(db: Session, today: date) -> dict:
+    """Counter dashboard dalam satu query GROUP BY brand.
+
+    expiring_soon = 0 < days_left <= 7, expired = days_left < 0 (sama dengan
+    definisi lama di route root).
+    """
+    brand = brand_key_expr()
+    soon = case(
+        (and_(Subscription.expires_at > today, Subscription.expires_at <= today + timedelta(days=7)), 1),
+        else_=0,
+    )
+    expired = case((Subscription.expires_at < today, 1), else_=0)
+    rows = (
+        db.query(brand, func.count(Subscription.id), func.sum(soon), func.sum(expired))
+        .filter(Subscription.is_archived == False)
+        .group_by(brand)
+        .order_by(brand)
+        .all()
+    )
+    return {
+        "total": sum(r[1] for r in rows),
+        "expiring_soon": sum(int(r[2] or 0) for r in rows),
+        "expired_count": sum(int(r[3] or 0) for r in rows),
+        "brands": {r[0]: r[1] for r in rows},
+    }
+
+
+# ekspresi yang sama dipakai untuk index trigram (migrations.py, v3),
+# jadi harus literal persis agar planner Postgres bisa memakai index-nya
+SEARCH_EXPR = "lower(subscription.name || ' ' || coalesce(subscription.brand, '') || ' ' || subscription.url)"
+
+
+def _like_escape(s: str) -> str:
+    return s.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def search_subscriptions(db: Session, q: str, limit: int = 20, archived: bool = False):
+    """Cari di name/brand/url. Urutan: prefix nama, prefix brand/url, lalu
+    substring (Postgres: + kemiripan trigram, toleran typo)."""
+    q = q.strip().lower()
+    if not q:
+        return []
+    haystack = literal_column(SEARCH_EXPR)
+    name_l = func.lower(Subscription.name)
+    brand_l = func.lower(func.coalesce(Subscription.brand, ""))
+    url_l = func.lower(Subscription.url)
+    pat = _like_escape(q)
+
+    match = haystack.like(f"%{pat}%", escape="\\")
+    rank = case(
+        (name_l.like(f"{pat}%", escape="\\"), 0),
+        (or_(brand_l.like(f"{pat}%", escape="\\"),
+             url_l.like(f"{pat}%", escape="\\"),
+             url_l.like(f"%://{pat}%", escape="\\")), 1),
+        else_=2,
+    )
+    order = [rank]
+
+    if db.get_bind().dialect.name == "postgresql":
+        # operator % (pg_trgm) memakai index GIN yang sama
+        match = or_(match, haystack.op("%")(q))
+        order.append(func.similarity(haystack, q).desc())
+
+    order += [Subscription.expires_at.asc(), Subscription.id.asc()]
+    return (
+        db.query(Subscription)
+        .filter(Subscription.is_archived == archived, match)
+        .order_by(*order)
+        .limit(limit)
+        .all()
+    )
+
+
 def create_subscription(db: Session, sub: SubscriptionCreate):
     db_sub = Subscription(**sub.model_dump())
     db.add(db_sub)
     db.commit()
     db.refresh(db_sub)
+    emit_change("subscription", [db_sub.id])
     return db_sub
 
 
@@ -46,6 +244,7 @@ def update_subscription(db: Session, sub_id: int, sub: SubscriptionCreate):
             setattr(db_sub, key, value)
         db.commit()
         db.refresh(db_sub)
+        emit_change("subscription", [sub_id])
     return db_sub
 
 
@@ -54,6 +253,7 @@ def delete_subscription(db: Session, sub_id: int):
     if db_sub:
         db.delete(db_sub)
         db.commit()
+        emit_change("subscription", [sub_id])
     return True
 
 
@@ -63,66 +263,434 @@ def archive_subscription(db: Session, sub_id: int, archived: bool = True):
         db_sub.is_archived = archived
         db.commit()
         db.refresh(db_sub)
+        emit_change("subscription", [sub_id])
     return db_sub
 
 
-def bulk_archive(db: Session, ids: list[int], archived: bool = True):
+# ========== Bulk (set-based) ==========
+# id list dipecah per batch supaya jumlah bind parameter aman
+# (SQLite lama maks 999, Postgres 65535). Semua batch satu transaksi.
+BULK_ID_BATCH = 900
+
+
+def _id_batches(ids: list[int]):
+    ids = list(dict.fromkeys(ids))
+    for i in range(0, len(ids), BULK_ID_BATCH):
+        yield ids[i:i + BULK_ID_BATCH]
+
+
+def renewed_expiry(db: Session, add_days: int):
+    """expires_at + add_days dihitung di SQL (tanpa load baris ke Python)."""
+    if db.get_bind().dialect.name == "sqlite":
+        return func.date(Subscription.expires_at, f"{add_days:+d} days")
+    return Subscription.expires_at + add_days
+
+
+def _update_ids(db: Session, ids: list[int], values: dict) -> int:
+    affected = 0
+    for batch in _id_batches(ids):
+        affected += db.query(Subscription).filter(Subscription.id.in_(batch)).update(
+            values, synchronize_session=False
+        )
+    return affected
+
+
+def bulk_archive(db: Session, ids: list[int], archived: bool = True) -> int:
     if not ids:
-        return
-    db.query(Subscription).filter(Subscription.id.in_(ids)).update(
-        {"is_archived": archived},
-        synchronize_session=False,
-    )
+        return 0
+    affected = _update_ids(db, ids, {"is_archived": archived})
     db.commit()
+    emit_change("subscription", ids)
+    return affected
 
 
-def bulk_delete(db: Session, ids: list[int]):
+def bulk_delete(db: Session, ids: list[int]) -> int:
     if not ids:
-        return
-    db.query(Subscription).filter(Subscription.id.in_(ids)).delete(
-        synchronize_session=False
+        return 0
+    affected = 0
+    for batch in _id_batches(ids):
+        affected += db.query(Subscription).filter(Subscription.id.in_(batch)).delete(
+            synchronize_session=False
+        )
+    db.commit()
+    emit_change("subscription", ids)
+    return affected
+
+
+def quick_renew(db: Session, sub_id: int, add_days: int) -> int:
+    return bulk_renew(db, [sub_id], add_days)
+
+
+def bulk_renew(db: Session, ids: list[int], add_days: int) -> int:
+    if not ids:
+        return 0
+    affected = _update_ids(db, ids, {"expires_at": renewed_expiry(db, add_days)})
+    db.commit()
+    emit_change("subscription", ids)
+    return affected
+
+
+def _filtered(
+    db: Session,
+    brand: str | None = None,
+    start: date | None = None,
+    end: date | None = None,
+    archived: bool | None = False,
+):
+    """Filter bulk: brand (key sama dengan grouping dashboard) + rentang expires_at."""
+    q = db.query(Subscription)
+    if archived is not None:
+        q = q.filter(Subscription.is_archived == archived)
+    if brand:
+        q = q.filter(brand_key_expr() == brand.strip().upper())
+    if start is not None:
+        q = q.filter(Subscription.expires_at >= start)
+    if end is not None:
+        q = q.filter(Subscription.expires_at <= end)
+    return q
+
+
+def renew_by_filter(db: Session, add_days: int, brand=None, start=None, end=None, archived=False) -> int:
+    affected = _filtered(db, brand, start, end, archived).update(
+        {"expires_at": renewed_expiry(db, add_days)}, synchronize_session=False
     )
     db.commit()
+    emit_change("subscription", None)
+    return affected
 
 
-def quick_renew(db: Session, sub_id: int, add_days: int):
-    sub = db.query(Subscription).filter(Subscription.id == sub_id).first()
-    if not sub:
-        return None
-    sub.expires_at = sub.expires_at.fromordinal(sub.expires_at.toordinal() + add_days)
+def archive_by_filter(db: Session, archived: bool, brand=None, start=None, end=None) -> int:
+    affected = _filtered(db, brand, start, end, not archived).update(
+        {"is_archived": archived}, synchronize_session=False
+    )
     db.commit()
-    db.refresh(sub)
-    return sub
+    emit_change("subscription", None)
+    return affected
 
 
-def bulk_renew(db: Session, ids: list[int], add_days: int):
-    if not ids:
-        return
-    subs = db.query(Subscription).filter(Subscription.id.in_(ids)).all()
-    for s in subs:
-        s.expires_at = s.expires_at.fromordinal(s.expires_at.toordinal() + add_days)
+def delete_by_filter(db: Session, brand=None, start=None, end=None, archived=False) -> int:
+    affected = _filtered(db, brand, start, end, archived).delete(synchronize_session=False)
     db.commit()
+    emit_change("subscription", None)
+    return affected
 
 
-def set_last_notified(db: Session, sub_id: int, stage: str):
-    sub = db.query(Subscription).filter(Subscription.id == sub_id).first()
-    if not sub:
-        return
-    sub.last_notified_at = datetime.utcnow()
-    sub.last_notified_stage = stage
+IMPORT_FIELDS = ("name", "url", "brand", "expires_at", "is_archived")
+
+
+def _dialect_insert(db: Session):
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    return dialect_insert
+
+
+def upsert_subscriptions(db: Session, rows: list[dict]) -> tuple[int, int]:
+    """Tulis satu batch baris import; return (inserted, updated).
+
+    Baris ber-id -> INSERT ... ON CONFLICT (id) DO UPDATE, tanpa id -> INSERT.
+    Tidak commit: caller commit sekali di akhir file (satu transaksi).
+    """
+    # id dobel dalam satu statement ditolak ON CONFLICT -> yang terakhir menang
+    with_id = {r["id"]: r for r in rows if r.get("id") is not None}
+    new_rows = [{k: r[k] for k in IMPORT_FIELDS} for r in rows if r.get("id") is None]
+    updated = 0
+
+    if with_id:
+        updated = (
+            db.query(func.count(Subscription.id))
+            .filter(Subscription.id.in_(list(with_id)))
+            .scalar()
+        )
+        stmt = _dialect_insert(db)(Subscription).values(
+            [{"id": i, **{k: r[k] for k in IMPORT_FIELDS}} for i, r in with_id.items()]
+        )
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[Subscription.id],
+            set_={k: stmt.excluded[k] for k in IMPORT_FIELDS},
+        ))
+        if db.get_bind().dialect.name == "postgresql":
+            # id eksplisit tidak memajukan sequence SERIAL
+            db.execute(text(
+                "SELECT setval(pg_get_serial_sequence('subscription', 'id'), "
+                "(SELECT COALESCE(MAX(id), 1) FROM subscription))"
+            ))
+
+    if new_rows:
+        db.execute(insert(Subscription), new_rows)
+
+    return len(with_id) - updated + len(new_rows), updated
+
+
+REMINDER_COUNTERS = ("reminder_count_h3", "reminder_count_h2", "reminder_count_h1", "reminder_count_h0")
+
+
+def mark_notified(db: Session, stage: str, ids_by_counter: dict[str, list[int]]):
+    """Tandai satu batch reminder: satu UPDATE per counter per BULK_ID_BATCH
+    id (batas bound parameter SQLite), satu COMMIT.
+
+    ids_by_counter: nama kolom counter (lihat REMINDER_COUNTERS) -> id yang
+    counter-nya di-increment.
+    """
+    now = datetime.utcnow()
+    count = 0
+    for col, col_ids in ids_by_counter.items():
+        values = {"last_notified_at": now, "last_notified_stage": stage}
+        if col in REMINDER_COUNTERS:
+            values[col] = func.coalesce(getattr(Subscription, col), 0) + 1
+        count += _update_ids(db, col_ids, values)
+    if count:
+        db.commit()
+    return count
+
+
+# ========== Heartbeats ==========
+def touch_heartbeat(db: Session, name: str, worker: str, status: str = "ok"):
+    # satu upsert (DML -> selalu primary), bukan SELECT lalu UPDATE: SELECT
+    # di RoutingSession bisa jatuh ke replica yang tertinggal
+    values = {"name": name, "last_run_at": datetime.utcnow(), "worker": worker, "status": status}
+    stmt = _dialect_insert(db)(JobHeartbeat).values(**values)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[JobHeartbeat.name],
+        set_={k: stmt.excluded[k] for k in ("last_run_at", "worker", "status")},
+    ))
     db.commit()
 
 
+def get_heartbeats(db: Session):
+    return db.query(JobHeartbeat).order_by(JobHeartbeat.name.asc()).all()
+
+
 # ========== Logs ==========
-def add_log(db: Session, level: str, message: str):
-    db.add(LogEntry(level=level, message=message))
+def add_logs(db: Session, entries: list[dict]):
+    """Tulis satu batch log (dipakai log_buffer): satu INSERT, satu commit."""
+    if not entries:
+        return
+    db.execute(insert(LogEntry), entries)
     db.commit()
+    emit_change("log", None)
 
 
 def get_latest_logs(db: Session, limit: int = 200):
+    # scan mundur index (created_at, id), tidak sort seluruh tabel
     return (
         db.query(LogEntry)
-        .order_by(desc(LogEntry.created_at))
+        .order_by(desc(LogEntry.created_at), desc(LogEntry.id))
         .limit(limit)
         .all()
     )
+
+
+def get_logs_page(
+    db: Session,
+    limit: int,
+    after: tuple[datetime, int] | None = None,
+    levels: list[str] | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+):
+    """Keyset pagination log terbaru dulu (created_at, id desc). Return limit+1
+    baris maksimal, sama seperti get_subscriptions_page."""
+    q = db.query(LogEntry)
+    if levels:
+        q = q.filter(LogEntry.level.in_(levels))
+    if start is not None:
+        q = q.filter(LogEntry.created_at >= start)
+    if end is not None:
+        q = q.filter(LogEntry.created_at < end)
+    if after is not None:
+        after_ts, after_id = after
+        q = q.filter(
+            LogEntry.created_at <= after_ts,
+            or_(
+                LogEntry.created_at < after_ts,
+                and_(LogEntry.created_at == after_ts, LogEntry.id < after_id),
+            ),
+        )
+    return (
+        q.order_by(LogEntry.created_at.desc(), LogEntry.id.desc())
+        .limit(limit + 1)
+        .all()
+    )
+
+
+def get_oldest_log_time(db: Session) -> datetime | None:
+    return db.query(func.min(LogEntry.created_at)).scalar()
+
+
+def get_last_rollup_day(db: Session) -> date | None:
+    return db.query(func.max(LogDaily.day)).scalar()
+
+
+def rollup_logs(db: Session, day: date, start: datetime, end: datetime) -> dict[str, int]:
+    """Hitung log per level di [start, end) dan simpan sebagai rekap `day`."""
+    counts = dict(
+        db.query(LogEntry.level, func.count(LogEntry.id))
+        .filter(LogEntry.created_at >= start, LogEntry.created_at < end)
+        .group_by(LogEntry.level)
+        .all()
+    )
+    if counts:
+        stmt = _dialect_insert(db)(LogDaily).values(
+            [{"day": day, "level": level or "INFO", "count": n} for level, n in counts.items()]
+        )
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[LogDaily.day, LogDaily.level],
+            set_={"count": stmt.excluded.count},
+        ))
+    db.commit()
+    return counts
+
+
+def prune_logs(db: Session, before: datetime, batch_size: int = 5000) -> int:
+    """Hapus satu batch log yang lebih tua dari `before`; return jumlah baris."""
+    oldest = (
+        select(LogEntry.id)
+        .where(LogEntry.created_at < before)
+        .order_by(LogEntry.created_at)
+        .limit(batch_size)
+    )
+    res = db.execute(
+        delete(LogEntry).where(LogEntry.id.in_(oldest.scalar_subquery())),
+        execution_options={"synchronize_session": False},
+    )
+    db.commit()
+    if res.rowcount:
+        emit_change("log", None)
+    return res.rowcount
+
+
+def get_log_rollups(db: Session, since: date):
+    return (
+        db.query(LogDaily)
+        .filter(LogDaily.day >= since)
+        .order_by(LogDaily.day.desc(), LogDaily.level.asc())
+        .all()
+    )
+
+
+# ========== Outbox ==========
+def enqueue_outbox(db: Session, rows: list[dict], commit: bool = False) -> int:
+    """Tambah pesan (idempotency_key, chat_id, text) ke outbox.
+
+    Default TANPA commit: ikut transaksi perubahan data pemanggil, jadi
+    pesan hanya ada kalau datanya juga tersimpan. Key yang sudah ada
+    dilewati. Return jumlah baris baru.
+    """
+    if not rows:
+        return 0
+    now = datetime.utcnow()
+    stmt = _dialect_insert(db)(OutboxMessage).values([
+        {**r, "status": "pending", "attempts": 0, "next_attempt_at": now, "created_at": now}
+        for r in rows
+    ]).on_conflict_do_nothing(index_elements=["idempotency_key"])
+    count = db.execute(stmt).rowcount
+    if commit:
+        db.commit()
+    return count
+
+
+def claim_outbox(db: Session, now: datetime, limit: int, lease_until: datetime) -> list[OutboxMessage]:
+    """Ambil pesan jatuh tempo (urut id) dan tandai 'sending' sampai lease_until.
+
+    Claim = compare-and-set: UPDATE hanya mengenai baris yang MASIH bisa
+    di-claim, dan yang dikembalikan hanya baris hasil UPDATE itu (RETURNING).
+    Dua worker yang memilih kandidat sama (SQLite mengabaikan FOR UPDATE)
+    tidak bisa sama-sama mendapatkannya. Postgres: kandidat dipilih dengan
+    FOR UPDATE SKIP LOCKED supaya worker lain langsung ambil pesan berikutnya.
+    Pesan 'sending' yang lease-nya habis (worker mati di tengah kirim)
+    diambil ulang.
+    """
+    claimable = or_(
+        and_(OutboxMessage.status == "pending", OutboxMessage.next_attempt_at <= now),
+        and_(OutboxMessage.status == "sending", OutboxMessage.locked_until < now),
+    )
+    ids = db.scalars(
+        select(OutboxMessage.id)
+        .where(claimable)
+        .order_by(OutboxMessage.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    ).all()
+    if not ids:
+        db.commit()
+        return []
+    rows = db.scalars(
+        update(OutboxMessage)
+        .where(OutboxMessage.id.in_(ids), claimable)
+        .values(
+            status="sending",
+            locked_until=lease_until,
+            attempts=func.coalesce(OutboxMessage.attempts, 0) + 1,
+        )
+        .returning(OutboxMessage),
+        execution_options={"synchronize_session": False, "populate_existing": True},
+    ).all()
+    db.commit()
+    return sorted(rows, key=lambda r: r.id)
+
+
+def mark_outbox_sent(db: Session, msg_id: int):
+    db.query(OutboxMessage).filter(OutboxMessage.id == msg_id).update(
+        {"status": "sent", "sent_at": datetime.utcnow(), "locked_until": None, "last_error": None},
+        synchronize_session=False,
+    )
+    db.commit()
+
+
+def mark_outbox_failed(db: Session, msg_id: int, error: str, retry_at: datetime | None):
+    """retry_at=None: menyerah (status 'failed'), selain itu dicoba lagi."""
+    db.query(OutboxMessage).filter(OutboxMessage.id == msg_id).update(
+        {
+            "status": "pending" if retry_at else "failed",
+            "next_attempt_at": retry_at or datetime.utcnow(),
+            "locked_until": None,
+            "last_error": error[:500],
+        },
+        synchronize_session=False,
+    )
+    db.commit()
+
+
+def renew_outbox_lease(db: Session, ids: list[int], held_until: datetime, lease_until: datetime) -> int:
+    """Perpanjang lease pesan yang masih dipegang pemanggil (locked_until ==
+    held_until). Return jumlah baris; kurang dari len(ids) berarti sebagian
+    lease sudah habis dan pesan itu bisa sudah di-claim worker lain."""
+    count = 0
+    for batch in _id_batches(ids):
+        count += db.query(OutboxMessage).filter(
+            OutboxMessage.id.in_(batch),
+            OutboxMessage.status == "sending",
+            OutboxMessage.locked_until == held_until,
+        ).update({"locked_until": lease_until}, synchronize_session=False)
+    db.commit()
+    return count
+
+
+def release_outbox(db: Session, ids: list[int], not_before: datetime | None = None) -> int:
+    """Kembalikan pesan yang sudah di-claim tapi belum dicoba kirim."""
+    values = {"status": "pending", "locked_until": None, "attempts": OutboxMessage.attempts - 1}
+    if not_before:
+        values["next_attempt_at"] = not_before
+    count = 0
+    for batch in _id_batches(ids):
+        count += db.query(OutboxMessage).filter(
+            OutboxMessage.id.in_(batch), OutboxMessage.status == "sending",
+        ).update(values, synchronize_session=False)
+    db.commit()
+    return count
+
+
+def prune_outbox(db: Session, before: datetime) -> int:
+    res = db.execute(
+        delete(OutboxMessage).where(OutboxMessage.status == "sent", OutboxMessage.sent_at < before),
+        execution_options={"synchronize_session": False},
+    )
+    db.commit()
+    return res.rowcount
+
+
+def get_outbox_counts(db: Session) -> dict[str, int]:
+    rows = db.query(OutboxMessage.status, func.count()).group_by(OutboxMessage.status).all()
+    return {status: n for status, n in rows}
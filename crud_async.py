@@ -0,0 +1,202 @@
+"""Versi async dari fungsi-fungsi di crud.py.
+
+Query tetap ditulis sekali di crud.py; di sini tiap fungsi dijalankan lewat
+AsyncSession.run_sync() sehingga I/O ke database memakai driver async
+(psycopg) dan tidak memblokir event loop uvicorn.
+"""
+from datetime import date, datetime
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import crud
+from schemas import SubscriptionCreate
+
+
+# ========== Subscription ==========
+async def get_subscriptions(db: AsyncSession):
+    return await db.run_sync(crud.get_subscriptions)
+
+
+async def get_archived_subscriptions(db: AsyncSession):
+    return await db.run_sync(crud.get_archived_subscriptions)
+
+
+async def get_subscription(db: AsyncSession, sub_id: int):
+    return await db.run_sync(crud.get_subscription, sub_id)
+
+
+async def get_subscriptions_by_ids(db: AsyncSession, ids: list[int]):
+    return await db.run_sync(crud.get_subscriptions_by_ids, ids)
+
+
+async def get_all_subscriptions(db: AsyncSession, include_archived: bool = False):
+    return await db.run_sync(crud.get_all_subscriptions, include_archived)
+
+
+async def iter_export_rows(db: AsyncSession, batch_size: int = 1000, include_archived: bool = True):
+    """Baris export per batch lewat server-side cursor (tidak dimuat sekaligus).
+
+    Tidak bisa lewat run_sync karena hasilnya di-yield bertahap.
+    """
+    stmt = crud.export_query(include_archived).execution_options(yield_per=batch_size)
+    result = await db.stream(stmt)
+    async for rows in result.partitions():
+        yield rows
+
+
+async def get_due_subscriptions(db: AsyncSession, start: date, end: date):
+    return await db.run_sync(crud.get_due_subscriptions, start, end)
+
+
+async def get_subscriptions_page(
+    db: AsyncSession,
+    limit: int,
+    after: tuple[date, int] | None = None,
+    start: date | None = None,
+    end: date | None = None,
+    brand: str | None = None,
+    archived: bool = False,
+):
+    return await db.run_sync(crud.get_subscriptions_page, limit, after, start, end, brand, archived)
+
+
+async def get_dashboard_stats(db: AsyncSession, today: date) -> dict:
+    return await db.run_sync(crud.get_dashboard_stats, today)
+
+
+async def search_subscriptions(db: AsyncSession, q: str, limit: int = 20, archived: bool = False):
+    return await db.run_sync(crud.search_subscriptions, q, limit, archived)
+
+
+async def create_subscription(db: AsyncSession, sub: SubscriptionCreate):
+    return await db.run_sync(crud.create_subscription, sub)
+
+
+async def update_subscription(db: AsyncSession, sub_id: int, sub: SubscriptionCreate):
+    return await db.run_sync(crud.update_subscription, sub_id, sub)
+
+
+async def delete_subscription(db: AsyncSession, sub_id: int):
+    return await db.run_sync(crud.delete_subscription, sub_id)
+
+
+async def archive_subscription(db: AsyncSession, sub_id: int, archived: bool = True):
+    return await db.run_sync(crud.archive_subscription, sub_id, archived)
+
+
+async def bulk_archive(db: AsyncSession, ids: list[int], archived: bool = True) -> int:
+    return await db.run_sync(crud.bulk_archive, ids, archived)
+
+
+async def bulk_delete(db: AsyncSession, ids: list[int]) -> int:
+    return await db.run_sync(crud.bulk_delete, ids)
+
+
+async def quick_renew(db: AsyncSession, sub_id: int, add_days: int) -> int:
+    return await db.run_sync(crud.quick_renew, sub_id, add_days)
+
+
+async def bulk_renew(db: AsyncSession, ids: list[int], add_days: int) -> int:
+    return await db.run_sync(crud.bulk_renew, ids, add_days)
+
+
+async def renew_by_filter(db: AsyncSession, add_days: int, brand=None, start=None, end=None, archived=False) -> int:
+    return await db.run_sync(crud.renew_by_filter, add_days, brand, start, end, archived)
+
+
+async def archive_by_filter(db: AsyncSession, archived: bool, brand=None, start=None, end=None) -> int:
+    return await db.run_sync(crud.archive_by_filter, archived, brand, start, end)
+
+
+async def delete_by_filter(db: AsyncSession, brand=None, start=None, end=None, archived=False) -> int:
+    return await db.run_sync(crud.delete_by_filter, brand, start, end, archived)
+
+
+async def upsert_subscriptions(db: AsyncSession, rows: list[dict]) -> tuple[int, int]:
+    return await db.run_sync(crud.upsert_subscriptions, rows)
+
+
+async def mark_notified(db: AsyncSession, stage: str, ids_by_counter: dict[str, list[int]]):
+    return await db.run_sync(crud.mark_notified, stage, ids_by_counter)
+
+
+# ========== Heartbeats ==========
+async def touch_heartbeat(db: AsyncSession, name: str, worker: str, status: str = "ok"):
+    return await db.run_sync(crud.touch_heartbeat, name, worker, status)
+
+
+async def get_heartbeats(db: AsyncSession):
+    return await db.run_sync(crud.get_heartbeats)
+
+
+# ========== Logs ==========
+async def add_logs(db: AsyncSession, entries: list[dict]):
+    return await db.run_sync(crud.add_logs, entries)
+
+
+async def get_latest_logs(db: AsyncSession, limit: int = 200):
+    return await db.run_sync(crud.get_latest_logs, limit)
+
+
+async def get_logs_page(
+    db: AsyncSession,
+    limit: int,
+    after: tuple[datetime, int] | None = None,
+    levels: list[str] | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+):
+    return await db.run_sync(crud.get_logs_page, limit, after, levels, start, end)
+
+
+async def get_oldest_log_time(db: AsyncSession) -> datetime | None:
+    return await db.run_sync(crud.get_oldest_log_time)
+
+
+async def get_last_rollup_day(db: AsyncSession) -> date | None:
+    return await db.run_sync(crud.get_last_rollup_day)
+
+
+async def rollup_logs(db: AsyncSession, day: date, start: datetime, end: datetime) -> dict[str, int]:
+    return await db.run_sync(crud.rollup_logs, day, start, end)
+
+
+async def prune_logs(db: AsyncSession, before: datetime, batch_size: int = 5000) -> int:
+    return await db.run_sync(crud.prune_logs, before, batch_size)
+
+
+async def get_log_rollups(db: AsyncSession, since: date):
+    return await db.run_sync(crud.get_log_rollups, since)
+
+
+# ========== Outbox ==========
+async def enqueue_outbox(db: AsyncSession, rows: list[dict], commit: bool = False) -> int:
+    return await db.run_sync(crud.enqueue_outbox, rows, commit)
+
+
+async def claim_outbox(db: AsyncSession, now: datetime, limit: int, lease_until: datetime):
+    return await db.run_sync(crud.claim_outbox, now, limit, lease_until)
+
+
+async def mark_outbox_sent(db: AsyncSession, msg_id: int):
+    return await db.run_sync(crud.mark_outbox_sent, msg_id)
+
+
+async def mark_outbox_failed(db: AsyncSession, msg_id: int, error: str, retry_at: datetime | None):
+    return await db.run_sync(crud.mark_outbox_failed, msg_id, error, retry_at)
+
+
+async def renew_outbox_lease(db: AsyncSession, ids: list[int], held_until: datetime, lease_until: datetime) -> int:
+    return await db.run_sync(crud.renew_outbox_lease, ids, held_until, lease_until)
+
+
+async def release_outbox(db: AsyncSession, ids: list[int], not_before: datetime | None = None) -> int:
+    return await db.run_sync(crud.release_outbox, ids, not_before)
+
+
+async def prune_outbox(db: AsyncSession, before: datetime) -> int:
+    return await db.run_sync(crud.prune_outbox, before)
+
+
+async def get_outbox_counts(db: AsyncSession) -> dict[str, int]:
+    return await db.run_sync(crud.get_outbox_counts)
@@ -1,24 +1,177 @@
+import itertools
 import os
-from sqlalchemy import create_engine
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import create_engine, event, Select
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-
-DATABASE_URL = os.getenv("DATABASE_URL", "")
-
-# FIX format Render
-if DATABASE_URL.startswith("postgres://"):
-    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql+psycopg://", 1)
-elif DATABASE_URL.startswith("postgresql://"):
-    DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+psycopg://", 1)
-elif DATABASE_URL.startswith("postgresql+psycopg2://"):
-    DATABASE_URL = DATABASE_URL.replace("postgresql+psycopg2://", "postgresql+psycopg://", 1)
-
-engine = create_engine(
-    DATABASE_URL,
-    pool_pre_ping=True,
-    pool_recycle=300,
-    connect_args={"connect_timeout": 10},
-)
+from sqlalchemy.orm import sessionmaker, Session
+
+
+def _normalize_url(url: str) -> str:
+    # FIX format Render
+    url = url.strip()
+    if url.startswith("postgres://"):
+        return url.replace("postgres://", "postgresql+psycopg://", 1)
+    if url.startswith("postgresql://"):
+        return url.replace("postgresql://", "postgresql+psycopg://", 1)
+    if url.startswith("postgresql+psycopg2://"):
+        return url.replace("postgresql+psycopg2://", "postgresql+psycopg://", 1)
+    return url
+
+
+DATABASE_URL = _normalize_url(os.getenv("DATABASE_URL", ""))
+# replica read-only (streaming replication), pisah koma; kosong = semua ke primary
+REPLICA_URLS = [_normalize_url(u) for u in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if u.strip()]
+
+# SQLite (single node): sqlite:///rdr.db -> pysqlite untuk engine sync,
+# aiosqlite untuk engine async. File yang sama, mode WAL.
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+if IS_SQLITE:
+    SYNC_URL = DATABASE_URL.replace("sqlite+aiosqlite://", "sqlite://", 1)
+    ASYNC_URL = SYNC_URL.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    ENGINE_OPTS = {"connect_args": {"timeout": 30}}
+else:
+    SYNC_URL = ASYNC_URL = DATABASE_URL
+    ENGINE_OPTS = {
+        "pool_pre_ping": True,
+        "pool_recycle": 300,
+        "connect_args": {"connect_timeout": 10},
+    }
+
+
+def _pool_opts(prefix: str, default_size: int = 5, default_overflow: int = 10) -> dict:
+    return {
+        "pool_size": int(os.getenv(f"{prefix}_POOL_SIZE", str(default_size))),
+        "max_overflow": int(os.getenv(f"{prefix}_MAX_OVERFLOW", str(default_overflow))),
+        "pool_timeout": float(os.getenv(f"{prefix}_POOL_TIMEOUT", "30")),
+    }
+
+
+def _pool_for(url: str, opts: dict) -> dict:
+    # pool_size dkk hanya untuk QueuePool; SQLite in-memory pakai
+    # SingletonThreadPool / StaticPool yang menolak argumen tersebut
+    u = make_url(url)
+    return opts if issubclass(u.get_dialect().get_pool_class(u), QueuePool) else {}
+
+
+# ukuran pool per engine: DB_* untuk primary, DB_REPLICA_* untuk tiap replica
+PRIMARY_POOL = _pool_opts("DB")
+REPLICA_POOL = _pool_opts("DB_REPLICA", PRIMARY_POOL["pool_size"], PRIMARY_POOL["max_overflow"])
+
+# WAL: pembaca tidak memblok penulis. synchronous=NORMAL aman di WAL
+# (paling banyak kehilangan commit terakhir saat listrik mati, tidak korup).
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    "cache_size": -int(os.getenv("SQLITE_CACHE_KB", "65536")),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_BYTES", str(256 * 1024 * 1024))),
+    "temp_store": "MEMORY",
+    "foreign_keys": "ON",
+}
+
+
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+engine = create_engine(SYNC_URL, **ENGINE_OPTS, **_pool_for(SYNC_URL, PRIMARY_POOL))
+
+# psycopg 3 punya driver async sendiri, jadi URL yang sama bisa dipakai
+# untuk engine async (dipakai route FastAPI supaya event loop tidak ke-block).
+async_engine = create_async_engine(ASYNC_URL, **ENGINE_OPTS, **_pool_for(ASYNC_URL, PRIMARY_POOL))
+
+# replica hanya dipakai lewat AsyncSession (route + job); migrasi, leader
+# election dan ChangeBus memakai async_engine langsung = selalu primary
+replica_engines = [
+    create_async_engine(url, **ENGINE_OPTS, **_pool_for(url, REPLICA_POOL))
+    for url in (u.replace("sqlite://", "sqlite+aiosqlite://", 1) for u in REPLICA_URLS)
+]
+
+if IS_SQLITE:
+    for _eng in (engine, async_engine, *replica_engines):
+        event.listen(getattr(_eng, "sync_engine", _eng), "connect", _sqlite_pragmas)
+
+
+# ========== Routing primary / replica ==========
+# request tulis dan read-your-writes setelah redirect POST memaksa primary
+REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", "5"))
+_force_primary: ContextVar[bool] = ContextVar("db_force_primary", default=False)
+_replica_cycle = itertools.cycle([e.sync_engine for e in replica_engines]) if replica_engines else None
+
+
+@contextmanager
+def use_primary(enabled: bool = True):
+    """Semua query AsyncSession di dalam blok ini ke primary."""
+    token = _force_primary.set(_force_primary.get() or enabled)
+    try:
+        yield
+    finally:
+        _force_primary.reset(token)
+
+
+class RoutingSession(Session):
+    """SELECT biasa ke replica (round-robin), sisanya ke primary.
+
+    Begitu session menulis (flush / INSERT / UPDATE / DELETE), query
+    berikutnya di session yang sama ikut ke primary supaya membaca
+    tulisannya sendiri. SELECT ... FOR UPDATE dan text() juga ke primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        primary = async_engine.sync_engine
+        if _replica_cycle is None or _force_primary.get() or self.info.get("primary"):
+            return primary
+        if self._flushing or not isinstance(clause, Select) or clause._for_update_arg is not None:
+            if self._flushing or getattr(clause, "is_dml", False):
+                self.info["primary"] = True
+            return primary
+        return next(_replica_cycle)
+
+
+class PrimaryAfterWriteMiddleware:
+    """ASGI middleware: request non-GET selalu ke primary, dan request dari
+    session login yang sama tetap ke primary REPLICA_STICKY_SECONDS setelahnya
+    (halaman hasil redirect POST tidak membaca replica yang tertinggal).
+
+    Harus dipasang di dalam SessionMiddleware (add_middleware lebih dulu).
+    """
+
+    STICKY_KEY = "db_primary_until"
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or _replica_cycle is None:
+            return await self.app(scope, receive, send)
+        session = scope.get("session")
+        now = time.time()
+        primary = scope["method"] not in ("GET", "HEAD", "OPTIONS")
+        if primary and session:
+            session[self.STICKY_KEY] = now + REPLICA_STICKY_SECONDS
+        elif session and session.get(self.STICKY_KEY, 0) > now:
+            primary = True
+        with use_primary(primary):
+            await self.app(scope, receive, send)
+
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# expire_on_commit=False: object hasil query tetap bisa dibaca template
+# setelah commit tanpa lazy-load (lazy-load di AsyncSession = error).
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    sync_session_class=RoutingSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
 Base = declarative_base()
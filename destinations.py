@@ -0,0 +1,125 @@
+"""Registry tujuan notifikasi Telegram + fan-out paralel.
+
+Konfigurasi (env):
+- TELEGRAM_CHAT_ID       : chat default, menerima brand yang tidak dipetakan
+- TELEGRAM_BRAND_CHATS   : JSON brand -> chat, mis.
+                           {"BRAND01": "-1001", "BRAND02": ["-1002", "-1003"]}
+- TELEGRAM_OPS_CHAT_ID   : chat ops, mirror semua pesan (boleh kosong)
+- TELEGRAM_FANOUT_CONCURRENCY : maksimal chat yang dikirimi bersamaan
+
+Tanpa TELEGRAM_BRAND_CHATS / TELEGRAM_OPS_CHAT_ID semua pesan tetap ke
+TELEGRAM_CHAT_ID seperti sebelumnya. Chunk ke chat yang sama dikirim
+berurutan; antar chat paralel (rate limit tetap diatur TelegramSendQueue).
+"""
+import asyncio
+import json
+import logging
+import os
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Iterable
+
+from crud import brand_key
+from metrics import TELEGRAM_DESTINATION_CHUNKS
+
+logger = logging.getLogger(__name__)
+
+FANOUT_CONCURRENCY = int(os.getenv("TELEGRAM_FANOUT_CONCURRENCY", "4"))
+
+
+def _as_list(value) -> list[str]:
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return [str(v).strip() for v in value if str(v).strip()]
+    return [v.strip() for v in str(value).split(",") if v.strip()]
+
+
+@dataclass
+class DeliveryResult:
+    chat_id: str
+    sent: int = 0
+    total: int = 0
+
+    @property
+    def ok(self) -> bool:
+        return self.sent == self.total
+
+
+class DestinationRegistry:
+    def __init__(self, default_chats: list[str], brand_chats: dict[str, list[str]], ops_chats: list[str]):
+        self.default_chats = default_chats
+        self.brand_chats = {brand_key(b): chats for b, chats in brand_chats.items() if chats}
+        self.ops_chats = ops_chats
+
+    @classmethod
+    def from_env(cls) -> "DestinationRegistry":
+        raw = os.getenv("TELEGRAM_BRAND_CHATS", "").strip()
+        brand_chats = {}
+        if raw:
+            try:
+                brand_chats = {b: _as_list(c) for b, c in json.loads(raw).items()}
+            except (ValueError, AttributeError) as e:
+                logger.error(f"[TELEGRAM] TELEGRAM_BRAND_CHATS tidak valid, diabaikan: {e}")
+        return cls(
+            _as_list(os.getenv("TELEGRAM_CHAT_ID")),
+            brand_chats,
+            _as_list(os.getenv("TELEGRAM_OPS_CHAT_ID")),
+        )
+
+    def owners(self, brand: str | None) -> list[str]:
+        """Chat 'pemilik' brand: chat tim kalau dipetakan, selain itu chat default."""
+        return self.brand_chats.get(brand_key(brand), self.default_chats)
+
+    def chats_for(self, brand: str | None) -> list[str]:
+        """Semua chat yang menerima pesan brand ini (pemilik + mirror ops)."""
+        return list(dict.fromkeys(self.owners(brand) + self.ops_chats))
+
+    def all_chats(self) -> list[str]:
+        chats = self.default_chats + [c for cs in self.brand_chats.values() for c in cs] + self.ops_chats
+        return list(dict.fromkeys(chats))
+
+    def plan(self, brands: Iterable[str | None]) -> dict[str, list[str]]:
+        """chat -> daftar brand (urutan input) yang harus diterima chat itu."""
+        out: dict[str, list[str]] = {}
+        for brand in brands:
+            for chat in self.chats_for(brand):
+                out.setdefault(chat, []).append(brand)
+        return out
+
+    def stats(self) -> dict:
+        return {
+            "default": self.default_chats,
+            "brands": len(self.brand_chats),
+            "ops": self.ops_chats,
+            "chats": len(self.all_chats()),
+        }
+
+
+async def fan_out(
+    send: Callable[[str, str], Awaitable[bool]],
+    messages: dict[str, Iterable[str]],
+    concurrency: int = FANOUT_CONCURRENCY,
+) -> dict[str, DeliveryResult]:
+    """Kirim chunk tiap chat (berurutan per chat, paralel antar chat,
+    maksimal `concurrency` chat sekaligus). Return hasil per chat."""
+    sem = asyncio.Semaphore(max(1, concurrency))
+
+    async def deliver(chat_id: str, chunks: Iterable[str]) -> DeliveryResult:
+        res = DeliveryResult(chat_id)
+        async with sem:
+            for chunk in chunks:
+                res.total += 1
+                ok = await send(chat_id, chunk)
+                res.sent += ok
+                TELEGRAM_DESTINATION_CHUNKS.inc(chat=chat_id, outcome="ok" if ok else "failed")
+        return res
+
+    results = await asyncio.gather(*(deliver(c, m) for c, m in messages.items()))
+    return {r.chat_id: r for r in results}
+
+
+def summarize(results: dict[str, DeliveryResult]) -> str:
+    return ",".join(f"{r.chat_id}:{r.sent}/{r.total}" for r in results.values()) or "-"
+
+
+destinations = DestinationRegistry.from_env()
@@ -0,0 +1,97 @@
+"""Buffer untuk tabel `log`.
+
+Route dan scheduler cukup memanggil log_event(level, message): entry
+disimpan di memori lalu ditulis per batch (satu INSERT + satu commit),
+entah karena timer flush jatuh tempo atau buffer sudah penuh. Saat
+shutdown sisa buffer di-flush. Tidak ada commit tambahan per request.
+"""
+import asyncio
+import logging
+import os
+from collections import deque
+from datetime import datetime
+
+from database import AsyncSessionLocal
+from crud_async import add_logs
+
+logger = logging.getLogger(__name__)
+
+
+class LogBuffer:
+    def __init__(self, flush_interval: float = 2.0, batch_size: int = 200, max_pending: int = 10000):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+
+        self._pending: deque[dict] = deque()
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+        self._lock = asyncio.Lock()
+        self._stats = {"written": 0, "flushes": 0, "dropped": 0, "errors": 0}
+
+    # ---------- API ----------
+    def log(self, level: str, message: str):
+        self._pending.append({"level": level, "message": message, "created_at": datetime.utcnow()})
+        if len(self._pending) > self.max_pending:
+            # DB lama tidak bisa ditulis: buang yang paling lama, jangan sampai OOM
+            self._pending.popleft()
+            self._stats["dropped"] += 1
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return   # di luar event loop: ikut flush berikutnya / saat stop()
+        if len(self._pending) >= self.batch_size:
+            self._spawn_flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.flush_interval, self._spawn_flush)
+
+    async def flush(self):
+        async with self._lock:
+            while self._pending:
+                batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+                try:
+                    async with AsyncSessionLocal() as db:
+                        await add_logs(db, batch)
+                except Exception as e:
+                    # kembalikan ke depan antrian, dicoba lagi di flush berikutnya
+                    self._pending.extendleft(reversed(batch))
+                    self._stats["errors"] += 1
+                    logger.error(f"[LOG] flush gagal ({len(batch)} entry): {e}")
+                    break
+                self._stats["written"] += len(batch)
+                self._stats["flushes"] += 1
+
+    async def stop(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self.flush()
+        if self._pending:
+            logger.warning(f"[LOG] shutdown: {len(self._pending)} entry log tidak tersimpan")
+
+    def stats(self) -> dict:
+        return {"pending": len(self._pending), **self._stats}
+
+    # ---------- internals ----------
+    def _spawn_flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        task = asyncio.create_task(self._flush_and_rearm())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _flush_and_rearm(self):
+        await self.flush()
+        if self._pending and self._timer is None:
+            # flush gagal / ada entry baru selama flush
+            self._timer = asyncio.get_running_loop().call_later(self.flush_interval, self._spawn_flush)
+
+
+log_buffer = LogBuffer(
+    flush_interval=float(os.getenv("LOG_FLUSH_INTERVAL", "2")),
+    batch_size=int(os.getenv("LOG_BATCH_SIZE", "200")),
+    max_pending=int(os.getenv("LOG_MAX_PENDING", "10000")),
+)
+log_event = log_buffer.log
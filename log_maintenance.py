@@ -0,0 +1,75 @@
+"""Rekap harian + retensi tabel `log` (dijalankan leader, tier LOG-MAINT).
+
+1. Rekap: hari WIB yang sudah lewat dan belum direkap dihitung per level
+   ke tabel log_daily. Selalu jalan sebelum prune supaya hitungan tidak
+   hilang.
+2. Prune: log lebih tua dari LOG_RETENTION_DAYS dihapus per batch
+   (LOG_PRUNE_BATCH baris, commit per batch) supaya tidak ada transaksi
+   besar yang mengunci tabel. LOG_RETENTION_DAYS=0 mematikan prune.
+"""
+import asyncio
+import logging
+import os
+from datetime import date, datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from database import AsyncSessionLocal
+from crud_async import get_oldest_log_time, get_last_rollup_day, rollup_logs, prune_logs
+
+logger = logging.getLogger(__name__)
+timezone_wib = ZoneInfo("Asia/Jakarta")
+
+LOG_RETENTION_DAYS = int(os.getenv("LOG_RETENTION_DAYS", "30"))
+LOG_PRUNE_BATCH = int(os.getenv("LOG_PRUNE_BATCH", "5000"))
+
+
+def wib_to_utc(dt: datetime) -> datetime:
+    """Datetime WIB (atau naive = WIB) -> naive UTC seperti kolom created_at."""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone_wib)
+    return dt.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def day_bounds_utc(day: date) -> tuple[datetime, datetime]:
+    start = datetime(day.year, day.month, day.day)
+    return wib_to_utc(start), wib_to_utc(start + timedelta(days=1))
+
+
+async def rollup_pending_days(today: date) -> int:
+    async with AsyncSessionLocal() as db:
+        last = await get_last_rollup_day(db)
+        if last is not None:
+            day = last + timedelta(days=1)
+        else:
+            oldest = await get_oldest_log_time(db)
+            if oldest is None:
+                return 0
+            day = oldest.replace(tzinfo=timezone.utc).astimezone(timezone_wib).date()
+
+        done = 0
+        while day < today:
+            await rollup_logs(db, day, *day_bounds_utc(day))
+            day += timedelta(days=1)
+            done += 1
+    return done
+
+
+async def prune_old_logs(now: datetime) -> int:
+    if LOG_RETENTION_DAYS <= 0:
+        return 0
+    cutoff = wib_to_utc(now) - timedelta(days=LOG_RETENTION_DAYS)
+    total = 0
+    async with AsyncSessionLocal() as db:
+        while True:
+            n = await prune_logs(db, cutoff, LOG_PRUNE_BATCH)
+            total += n
+            if n < LOG_PRUNE_BATCH:
+                break
+            await asyncio.sleep(0.1)   # beri jeda untuk query lain
+    return total
+
+
+async def run_log_maintenance(now: datetime):
+    days = await rollup_pending_days(now.date())
+    pruned = await prune_old_logs(now)
+    logger.info(f"[LOG] rekap {days} hari, prune {pruned} baris (retensi {LOG_RETENTION_DAYS} hari)")
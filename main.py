@@ -1,35 +1,57 @@
-import os, secrets, re, asyncio, csv, io, logging
-from datetime import datetime
+import os, secrets, re, csv, io, logging, base64, json, zlib, codecs, time
+_IMPORT_T0 = time.perf_counter()
+from itertools import islice
+from datetime import datetime, timedelta, timezone
 from zoneinfo import ZoneInfo
 from collections import defaultdict
+from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, Depends, HTTPException, Request, Form, UploadFile, File
-from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
+from fastapi import FastAPI, Depends, HTTPException, Request, Form, UploadFile, File, Query
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse, Response, JSONResponse
+from starlette.concurrency import run_in_threadpool
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from starlette.middleware.sessions import SessionMiddleware
-from sqlalchemy import inspect, text
-from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.cron import CronTrigger
-
-from database import engine, SessionLocal, Base
-from models import Subscription, LogEntry
-from schemas import SubscriptionCreate
-from crud import (
-    get_subscriptions, get_archived_subscriptions, get_all_subscriptions,
+from sqlalchemy import text
+
+from database import (
+    engine, async_engine, replica_engines, AsyncSessionLocal,
+    PrimaryAfterWriteMiddleware, use_primary, REPLICA_STICKY_SECONDS,
+)
+from migrations import run_migrations
+from schemas import SubscriptionCreate, SubscriptionPage, Subscription as SubscriptionOut, LogPage, LogDaily
+from crud_async import (
+    get_subscriptions, get_archived_subscriptions,
+    get_subscription, get_subscriptions_page, search_subscriptions,
     create_subscription, update_subscription, delete_subscription,
     archive_subscription, bulk_archive, bulk_delete,
     quick_renew, bulk_renew,
-    get_latest_logs, add_log
+    renew_by_filter, archive_by_filter, delete_by_filter,
+    get_latest_logs,
+    touch_heartbeat, get_heartbeats,
+    get_dashboard_stats, iter_export_rows, upsert_subscriptions,
+    get_logs_page, get_log_rollups,
+    get_all_subscriptions, get_outbox_counts,
 )
+import crud
 from telegram_bot import (
-    send_telegram_message,
-    send_full_list_trigger,
+    start_http_client,
+    close_http_client,
+    send_queue,
+    full_list_messages,
     send_daily_summary,
-    send_reminders_3days,
-    send_reminders_2days,
-    send_reminders_1day_or_expired,
+    send_reminders_for,
+    REMINDER_STAGES,
 )
+from scheduler_logic import Dispatcher, Tier, default_tiers
+from reminder_engine import ReminderEngine
+from cluster import LeaderElector, ChangeBus, WORKER_ID
+from log_buffer import log_buffer, log_event
+from destinations import destinations
+from outbox import outbox_dispatcher, enqueue_messages, new_key
+from log_maintenance import run_log_maintenance, wib_to_utc
+from cache import data_version, dashboard_stats_cache, page_cache, etag_matches
+from metrics import registry, MetricsMiddleware
 
 logging.basicConfig(
     level=logging.INFO,
@@ -38,7 +60,43 @@ logging.basicConfig(
 )
 logger = logging.getLogger("RDR")
 
-app = FastAPI(title="RDR Hosting Reminder", openapi_url="/openapi.json", docs_url="/docs")
+def _lap(timings: dict, name: str, t0: float) -> float:
+    now = time.perf_counter()
+    timings[name] = round((now - t0) * 1000, 1)
+    return now
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # import main.py tidak menyentuh DB; semua I/O boot ada di sini
+    boot = {"import": round((_IMPORT_T1 - _IMPORT_T0) * 1000, 1)}
+    t0 = t = time.perf_counter()
+    await run_migrations(async_engine)
+    t = _lap(boot, "migrate", t)
+    async with async_engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))   # warm-up pool
+    t = _lap(boot, "db_warmup", t)
+    await start_http_client()
+    await send_queue.start()
+    outbox_dispatcher.start()
+    t = _lap(boot, "telegram", t)
+    change_bus.start()
+    # job reminder hanya jalan di worker yang jadi leader (lihat start_jobs)
+    leader.start()
+    t = _lap(boot, "cluster", t)
+    boot["total"] = round((t - t0) * 1000 + boot["import"], 1)
+    health_state["boot_ms"] = boot
+    logger.info("[BOOT] siap ✅ " + " | ".join(f"{k}={v}ms" for k, v in boot.items()))
+    try:
+        yield
+    finally:
+        await leader.stop()
+        await change_bus.stop()
+        await outbox_dispatcher.stop()
+        await send_queue.stop()
+        await log_buffer.stop()
+        await close_http_client()
+
+app = FastAPI(title="RDR Hosting Reminder", openapi_url="/openapi.json", docs_url="/docs", lifespan=lifespan)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
 timezone_wib = ZoneInfo("Asia/Jakarta")
@@ -47,47 +105,23 @@ SESSION_SECRET = os.getenv("SESSION_SECRET")
 if not SESSION_SECRET:
     SESSION_SECRET = secrets.token_urlsafe(32)
     logger.warning("[BOOT] SESSION_SECRET kosong. Session reset tiap restart.")
+# routing replica butuh request.session -> dipasang di dalam SessionMiddleware
+app.add_middleware(PrimaryAfterWriteMiddleware)
 app.add_middleware(SessionMiddleware, secret_key=SESSION_SECRET)
+app.add_middleware(MetricsMiddleware)
 
 # ========= Health state =========
+# heartbeat job disimpan di tabel job_heartbeat supaya semua worker sama;
+# dict ini hanya info lokal proses ini
 health_state = {
-    "last_daily": None, "last_h3": None, "last_h2": None, "last_h1": None,
     "boot_time": datetime.now(timezone_wib),
 }
-def _touch_health(key: str):
-    health_state[key] = datetime.now(timezone_wib)
-
-# ===================================
-# DB MIGRATION SAFE
-# ===================================
-logger.info("[BOOT] DB connect...")
-with engine.connect() as conn:
-    conn.execute(text("SELECT 1"))
-Base.metadata.create_all(bind=engine)
-
-with engine.begin() as conn:
-    inspector = inspect(engine)
-    sub_cols = [c["name"] for c in inspector.get_columns("subscription")]
-
-    required_sub_cols = [
-        "reminder_count_h3","reminder_count_h2","reminder_count_h1","reminder_count_h0",
-        "created_at","is_archived","last_notified_at","last_notified_stage"
-    ]
-    for col in required_sub_cols:
-        if col not in sub_cols:
-            if col == "created_at":
-                conn.execute(text("ALTER TABLE subscription ADD COLUMN created_at TIMESTAMP DEFAULT NOW()"))
-            elif col == "is_archived":
-                conn.execute(text("ALTER TABLE subscription ADD COLUMN is_archived BOOLEAN DEFAULT FALSE"))
-            elif col == "last_notified_at":
-                conn.execute(text("ALTER TABLE subscription ADD COLUMN last_notified_at TIMESTAMP NULL"))
-            elif col == "last_notified_stage":
-                conn.execute(text("ALTER TABLE subscription ADD COLUMN last_notified_stage VARCHAR NULL"))
-            else:
-                conn.execute(text(f"ALTER TABLE subscription ADD COLUMN {col} INTEGER DEFAULT 0"))
-            logger.info(f"[BOOT] added subscription.{col}")
-
-logger.info("[BOOT] DB OK ✅")
+async def _touch_health(key: str):
+    try:
+        async with AsyncSessionLocal() as db:
+            await touch_heartbeat(db, key, WORKER_ID)
+    except Exception as e:
+        logger.error(f"[HEALTH] heartbeat {key} gagal: {e}")
 
 
 # ===================================
@@ -138,275 +172,577 @@ def validate_input(name: str, url: str, expires_at: str, brand: str | None = Non
 # ===================================
 # ROUTES
 # ===================================
+def _wants_json(request: Request) -> bool:
+    # form dashboard -> redirect; client API (Accept: application/json) -> hasil JSON
+    return "application/json" in request.headers.get("accept", "")
+
+async def _dashboard_stats(db, today):
+    # key: versi data subscription + tanggal WIB (rollover tengah malam = key baru)
+    key = (data_version.get("subscription"), today)
+    stats = dashboard_stats_cache.get(key)
+    if stats is None:
+        stats = dashboard_stats_cache.set(key, await get_dashboard_stats(db, today))
+    return stats
+
 @app.get("/", response_class=HTMLResponse)
 async def root(request: Request, username: str = Depends(require_login)):
-    db = SessionLocal()
-    try:
-        subs = get_subscriptions(db)
-        archived = get_archived_subscriptions(db)
-
-        grouped = defaultdict(list)
-        for sub in subs:
-            grouped[(sub.brand or "Tanpa Brand").strip().upper()].append(sub)
-        grouped = dict(sorted(grouped.items()))
-
-        today = datetime.now(timezone_wib).date()
-        expiring_soon = sum(1 for s in subs if 0 < (s.expires_at - today).days <= 7)
-        expired_count = sum(1 for s in subs if (s.expires_at - today).days < 0)
-        logs = get_latest_logs(db, 200)
-    finally:
-        db.close()
+    today = datetime.now(timezone_wib).date()
+    # halaman hanya bergantung pada data + tanggal WIB + user; jam "Now" diisi JS
+    key = (data_version.get("subscription", "log"), today, username)
+    etag = data_version.etag(*key)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    body = page_cache.get(key)
+    if body is None:
+        body = page_cache.set(key, await _render_dashboard(request, username, today))
+    return HTMLResponse(body, headers=headers)
+
+async def _render_dashboard(request: Request, username: str, today) -> bytes:
+    # hasil render di-cache per versi data: kalau baru saja berubah, replica
+    # mungkin belum tersusul -> baca primary supaya cache tidak menyimpan data basi
+    fresh = data_version.age("subscription", "log") < REPLICA_STICKY_SECONDS
+    with use_primary(fresh):
+        async with AsyncSessionLocal() as db:
+            stats = await _dashboard_stats(db, today)
+            subs = await get_subscriptions(db)
+            archived = await get_archived_subscriptions(db)
+            logs = await get_latest_logs(db, 200)
+
+    grouped = defaultdict(list)
+    for sub in subs:
+        grouped[crud.brand_key(sub.brand)].append(sub)
+    grouped = dict(sorted(grouped.items()))
 
     return templates.TemplateResponse("index.html", {
         "request": request, "username": username,
         "subs": subs, "archived": archived, "grouped": grouped,
         "today": today, "now": datetime.now(timezone_wib),
-        "expiring_soon": expiring_soon, "expired_count": expired_count,
+        "total": stats["total"], "brand_counts": stats["brands"],
+        "expiring_soon": stats["expiring_soon"], "expired_count": stats["expired_count"],
         "logs": logs, "health": health_state
-    })
+    }).body
 
 @app.post("/add")
 async def add(username: str = Depends(require_login),
               name: str = Form(...), url: str = Form(...),
               brand: str | None = Form(None), expires_at: str = Form(...)):
     name, url, exp_date, brand = validate_input(name, url, expires_at, brand)
-    db = SessionLocal()
-    try:
-        create_subscription(db, SubscriptionCreate(name=name, url=url, expires_at=exp_date, brand=brand))
-        add_log(db, "INFO", f"Add: {name}")
-    finally:
-        db.close()
+    async with AsyncSessionLocal() as db:
+        await create_subscription(db, SubscriptionCreate(name=name, url=url, expires_at=exp_date, brand=brand))
+        log_event("INFO", f"Add: {name}")
     return RedirectResponse("/", status_code=303)
 
 @app.post("/update/{sub_id}")
-async def update(sub_id: int, username: str = Depends(require_login),
+async def update(sub_id: int, request: Request, username: str = Depends(require_login),
                  name: str = Form(...), url: str = Form(...),
                  brand: str | None = Form(None), expires_at: str = Form(...)):
     name, url, exp_date, brand = validate_input(name, url, expires_at, brand)
-    db = SessionLocal()
-    try:
-        old = db.query(Subscription).filter(Subscription.id == sub_id).first()
+    async with AsyncSessionLocal() as db:
+        old = await get_subscription(db, sub_id)
         if not old:
             raise HTTPException(status_code=404)
         old_exp = old.expires_at
 
-        update_subscription(db, sub_id, SubscriptionCreate(name=name, url=url, expires_at=exp_date, brand=brand))
-        add_log(db, "INFO", f"Update: {name}")
-
-        # notif jika diperpanjang
-        if exp_date > old_exp:
+        # notif jika diperpanjang: masuk outbox di transaksi yang sama dengan
+        # update (commit di update_subscription), dikirim dispatcher
+        renewed = exp_date > old_exp
+        if renewed:
             new_str = exp_date.strftime("%d %B %Y")
-            await send_telegram_message(f"✅ <b>{name}</b> sudah diperpanjang sampai <b>{new_str}</b>.")
-            add_log(db, "INFO", f"Renew notify: {name} -> {new_str}")
-    finally:
-        db.close()
+            text = f"✅ <b>{name}</b> sudah diperpanjang sampai <b>{new_str}</b>."
+            # key unik per request (bukan pasangan tanggal): renew A->B, undo,
+            # lalu renew A->B lagi tetap diumumkan; retry client pakai Idempotency-Key
+            key = new_key(f"renew:{sub_id}", request.headers.get("idempotency-key"))
+            await enqueue_messages(db, key, {chat: [text] for chat in destinations.chats_for(brand)})
+
+        await update_subscription(db, sub_id, SubscriptionCreate(name=name, url=url, expires_at=exp_date, brand=brand))
+        log_event("INFO", f"Update: {name}")
+        if renewed:
+            log_event("INFO", f"Renew notify queued: {name} -> {new_str}")
+    if renewed:
+        outbox_dispatcher.wake()
     return RedirectResponse("/", status_code=303)
 
 @app.post("/delete/{sub_id}")
 async def delete(sub_id: int, username: str = Depends(require_login)):
-    db = SessionLocal()
-    try:
-        delete_subscription(db, sub_id)
-        add_log(db, "WARN", f"Delete id={sub_id}")
-    finally:
-        db.close()
+    async with AsyncSessionLocal() as db:
+        await delete_subscription(db, sub_id)
+        log_event("WARN", f"Delete id={sub_id}")
     return RedirectResponse("/", status_code=303)
 
 @app.post("/archive/{sub_id}")
 async def archive(sub_id: int, username: str = Depends(require_login)):
-    db = SessionLocal()
-    try:
-        archive_subscription(db, sub_id, True)
-        add_log(db, "INFO", f"Archive id={sub_id}")
-    finally:
-        db.close()
+    async with AsyncSessionLocal() as db:
+        await archive_subscription(db, sub_id, True)
+        log_event("INFO", f"Archive id={sub_id}")
     return RedirectResponse("/", status_code=303)
 
 @app.post("/unarchive/{sub_id}")
 async def unarchive(sub_id: int, username: str = Depends(require_login)):
-    db = SessionLocal()
-    try:
-        archive_subscription(db, sub_id, False)
-        add_log(db, "INFO", f"Unarchive id={sub_id}")
-    finally:
-        db.close()
+    async with AsyncSessionLocal() as db:
+        await archive_subscription(db, sub_id, False)
+        log_event("INFO", f"Unarchive id={sub_id}")
     return RedirectResponse("/", status_code=303)
 
 @app.post("/bulk/archive")
 async def bulk_archive_route(request: Request, username: str = Depends(require_login)):
     form = await request.form()
     ids = [int(x) for x in form.getlist("ids")]
+    n = 0
     if ids:
-        db = SessionLocal()
-        try:
-            bulk_archive(db, ids, True)
-            add_log(db, "INFO", f"Bulk archive {ids}")
-        finally:
-            db.close()
+        async with AsyncSessionLocal() as db:
+            n = await bulk_archive(db, ids, True)
+        log_event("INFO", f"Bulk archive {n} subscription")
+    if _wants_json(request):
+        return {"affected": n}
     return RedirectResponse("/", status_code=303)
 
 @app.post("/bulk/delete")
 async def bulk_delete_route(request: Request, username: str = Depends(require_login)):
     form = await request.form()
     ids = [int(x) for x in form.getlist("ids")]
+    n = 0
     if ids:
-        db = SessionLocal()
-        try:
-            bulk_delete(db, ids)
-            add_log(db, "WARN", f"Bulk delete {ids}")
-        finally:
-            db.close()
+        async with AsyncSessionLocal() as db:
+            n = await bulk_delete(db, ids)
+        log_event("WARN", f"Bulk delete {n} subscription")
+    if _wants_json(request):
+        return {"affected": n}
     return RedirectResponse("/", status_code=303)
 
 @app.post("/bulk/renew/{days}")
 async def bulk_renew_route(days: int, request: Request, username: str = Depends(require_login)):
     form = await request.form()
     ids = [int(x) for x in form.getlist("ids")]
+    n = 0
     if ids:
-        db = SessionLocal()
-        try:
-            bulk_renew(db, ids, days)
-            add_log(db, "INFO", f"Bulk renew {ids} +{days}d")
-        finally:
-            db.close()
+        async with AsyncSessionLocal() as db:
+            n = await bulk_renew(db, ids, days)
+        log_event("INFO", f"Bulk renew {n} subscription +{days}d")
+    if _wants_json(request):
+        return {"affected": n}
     return RedirectResponse("/", status_code=303)
 
+BULK_FILTER_ACTIONS = ("renew", "archive", "unarchive", "delete")
+
+@app.post("/bulk/by-filter/{action}")
+async def bulk_by_filter_route(
+    action: str,
+    username: str = Depends(require_login),
+    brand: str | None = None,
+    status: str | None = None,
+    start: str | None = None,
+    end: str | None = None,
+    days: int | None = None,
+):
+    """Bulk berdasarkan filter, dieksekusi sebagai satu UPDATE/DELETE di DB.
+
+    Contoh: /bulk/by-filter/renew?brand=RDR&start=2025-01-01&end=2025-01-31&days=365
+    """
+    if action not in BULK_FILTER_ACTIONS:
+        raise HTTPException(status_code=404)
+    if status and status not in crud.STATUS_WINDOWS:
+        raise HTTPException(status_code=400, detail=f"status harus salah satu: {', '.join(crud.STATUS_WINDOWS)}")
+    if action == "renew" and not days:
+        raise HTTPException(status_code=400, detail="days wajib untuk renew")
+    try:
+        start_d = datetime.strptime(start, "%Y-%m-%d").date() if start else None
+        end_d = datetime.strptime(end, "%Y-%m-%d").date() if end else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Format tanggal yyyy-mm-dd")
+    if status:
+        # window status dipotong dengan start/end kalau keduanya ada
+        w_start, w_end = crud.status_window(status, datetime.now(timezone_wib).date())
+        start_d = max(filter(None, (start_d, w_start)), default=None)
+        end_d = min(filter(None, (end_d, w_end)), default=None)
+    # dicek setelah mapping: status=all tidak membatasi apa pun, jadi tanpa
+    # brand / window tanggal aksi ini akan kena semua subscription
+    if not ((brand or "").strip() or start_d or end_d):
+        raise HTTPException(status_code=400, detail="Minimal satu filter: brand, status (selain all), start, end")
+
+    async with AsyncSessionLocal() as db:
+        if action == "renew":
+            n = await renew_by_filter(db, days, brand, start_d, end_d)
+        elif action == "delete":
+            n = await delete_by_filter(db, brand, start_d, end_d)
+        else:
+            n = await archive_by_filter(db, action == "archive", brand, start_d, end_d)
+
+    desc = f"brand={brand or '*'} {start_d or '…'}..{end_d or '…'}" + (f" +{days}d" if action == "renew" else "")
+    log_event("WARN" if action == "delete" else "INFO", f"Bulk {action} by filter ({desc}): {n} subscription")
+    return {"action": action, "affected": n}
+
 @app.post("/quick-renew/{sub_id}/{days}")
 async def quick_renew_route(sub_id: int, days: int, username: str = Depends(require_login)):
-    db = SessionLocal()
-    try:
-        quick_renew(db, sub_id, days)
-        add_log(db, "INFO", f"Quick renew id={sub_id} +{days}d")
-    finally:
-        db.close()
+    async with AsyncSessionLocal() as db:
+        await quick_renew(db, sub_id, days)
+        log_event("INFO", f"Quick renew id={sub_id} +{days}d")
     return RedirectResponse("/", status_code=303)
 
-@app.get("/export")
-async def export_csv(username: str = Depends(require_login)):
-    db = SessionLocal()
-    try:
-        subs = get_all_subscriptions(db, include_archived=True)
-    finally:
-        db.close()
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
 
+def _csv_batch(rows) -> str:
     output = io.StringIO()
     w = csv.writer(output)
-    w.writerow(["id","name","url","brand","expires_at","is_archived"])
-    for s in subs:
-        w.writerow([s.id, s.name, s.url, s.brand or "",
-                    s.expires_at.strftime("%m/%d/%Y"),
-                    "1" if s.is_archived else "0"])
-    output.seek(0)
-    return StreamingResponse(output, media_type="text/csv",
-        headers={"Content-Disposition":"attachment; filename=rdr_subscriptions.csv"})
+    for r in rows:
+        w.writerow([r.id, r.name, r.url, r.brand or "",
+                    r.expires_at.strftime("%m/%d/%Y"),
+                    "1" if r.is_archived else "0"])
+    return output.getvalue()
+
+def _jsonl_batch(rows) -> str:
+    return "".join(
+        json.dumps({"id": r.id, "name": r.name, "url": r.url, "brand": r.brand,
+                    "expires_at": r.expires_at.isoformat(), "is_archived": bool(r.is_archived)},
+                   ensure_ascii=False) + "\n"
+        for r in rows
+    )
 
-@app.post("/import")
-async def import_csv(file: UploadFile = File(...), username: str = Depends(require_login)):
-    content = (await file.read()).decode("utf-8", errors="ignore")
-    reader = csv.DictReader(io.StringIO(content))
+async def _export_stream(fmt: str, gzip: bool):
+    # session dibuka di dalam generator: hidup selama response di-stream
+    gz = zlib.compressobj(6, zlib.DEFLATED, 31) if gzip else None
+    def out(s: str) -> bytes:
+        data = s.encode("utf-8")
+        return gz.compress(data) if gz else data
+
+    count = 0
+    if fmt == "csv":
+        yield out(",".join(crud.EXPORT_COLUMNS) + "\r\n")
+    async with AsyncSessionLocal() as db:
+        async for rows in iter_export_rows(db, EXPORT_BATCH_SIZE):
+            count += len(rows)
+            chunk = out(_csv_batch(rows) if fmt == "csv" else _jsonl_batch(rows))
+            if chunk:
+                yield chunk
+    if gz:
+        yield gz.flush()
+    logger.info(f"[EXPORT] {count} baris ({fmt}{', gzip' if gzip else ''})")
 
-    db = SessionLocal()
-    try:
-        for row in reader:
-            name = (row.get("name") or "").strip()
-            url = (row.get("url") or "").strip()
-            brand = (row.get("brand") or "").strip() or None
-            exp_str = (row.get("expires_at") or "").strip()
-            if not name or not url or not exp_str:
-                continue
-            _, _, exp_date, brand = validate_input(name, url, exp_str, brand)
-
-            sid = row.get("id")
-            if sid and sid.isdigit():
-                existing = db.query(Subscription).filter(Subscription.id == int(sid)).first()
-                if existing:
-                    existing.name = name
-                    existing.url = url
-                    existing.brand = brand
-                    existing.expires_at = exp_date
-                    existing.is_archived = row.get("is_archived") == "1"
-                    continue
-
-            create_subscription(db, SubscriptionCreate(name=name, url=url, expires_at=exp_date, brand=brand))
-
-        db.commit()
-        add_log(db, "INFO", f"CSV import success: {file.filename}")
-    finally:
-        db.close()
+@app.get("/export")
+async def export_csv(format: str = Query("csv", pattern="^(csv|jsonl)$"),
+                     gzip: bool = False,
+                     username: str = Depends(require_login)):
+    filename = f"rdr_subscriptions.{format}" + (".gz" if gzip else "")
+    media_type = "application/gzip" if gzip else (
+        "text/csv" if format == "csv" else "application/x-ndjson")
+    return StreamingResponse(_export_stream(format, gzip), media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}"})
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
+IMPORT_MAX_ERRORS = 1000   # baris error yang dimuat di report
+
+def _parse_import_row(row: dict) -> dict:
+    name, url, exp_date, brand = validate_input(
+        row.get("name") or "", row.get("url") or "",
+        row.get("expires_at") or "", row.get("brand"),
+    )
+    sid = (row.get("id") or "").strip()
+    return {
+        "id": int(sid) if sid.isdigit() else None,
+        "name": name, "url": url, "brand": brand, "expires_at": exp_date,
+        "is_archived": (row.get("is_archived") or "").strip() in ("1", "true", "True"),
+    }
 
+def _read_chunk(reader: csv.DictReader, size: int) -> list[tuple[int, dict]]:
+    return [(reader.line_num, row) for row in islice(reader, size)]
+
+@app.post("/import")
+async def import_csv(request: Request, file: UploadFile = File(...),
+                     username: str = Depends(require_login)):
+    # file upload sudah di-spool starlette; dibaca per baris, tidak dimuat utuh
+    reader = csv.DictReader(codecs.iterdecode(file.file, "utf-8-sig", errors="ignore"))
+    report = {"filename": file.filename, "rows": 0, "inserted": 0, "updated": 0,
+              "error_count": 0, "errors": []}
+    started = time.monotonic()
+
+    async with AsyncSessionLocal() as db:
+        try:
+            while True:
+                chunk = await run_in_threadpool(_read_chunk, reader, IMPORT_BATCH_SIZE)
+                if not chunk:
+                    break
+                valid = []
+                for line_no, row in chunk:
+                    if not any((v or "").strip() for v in row.values() if isinstance(v, str)):
+                        continue   # baris kosong
+                    report["rows"] += 1
+                    try:
+                        valid.append(_parse_import_row(row))
+                    except (HTTPException, ValueError) as e:
+                        report["error_count"] += 1
+                        if len(report["errors"]) < IMPORT_MAX_ERRORS:
+                            report["errors"].append(
+                                {"line": line_no, "error": getattr(e, "detail", None) or str(e)})
+                if valid:
+                    inserted, updated = await upsert_subscriptions(db, valid)
+                    report["inserted"] += inserted
+                    report["updated"] += updated
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"[IMPORT] gagal, rollback: {e}")
+            log_event("ERROR", f"CSV import gagal: {file.filename} ({e})")
+            raise HTTPException(status_code=500, detail="Import gagal, tidak ada data yang disimpan")
+
+    elapsed = time.monotonic() - started
+    report["elapsed_s"] = round(elapsed, 3)
+    report["rows_per_s"] = round(report["rows"] / elapsed) if elapsed > 0 else report["rows"]
+    crud.emit_change("subscription", None)
+    logger.info(
+        f"[IMPORT] {file.filename}: {report['rows']} baris, +{report['inserted']} "
+        f"~{report['updated']} !{report['error_count']} dalam {elapsed:.2f}s "
+        f"({report['rows_per_s']} baris/s)"
+    )
+    msg = (f"CSV import {file.filename}: {report['inserted']} baru, "
+           f"{report['updated']} update, {report['error_count']} error")
+    if report["errors"]:
+        msg += " | " + "; ".join(f"baris {e['line']}: {e['error']}" for e in report["errors"][:5])
+    log_event("WARN" if report["error_count"] else "INFO", msg)
+    if _wants_json(request):
+        return JSONResponse(report)
     return RedirectResponse("/", status_code=303)
 
 @app.get("/telegram-test")
-async def telegram_test(username: str = Depends(require_login)):
-    ok = await send_telegram_message("✅ <b>Telegram test OK</b>\nRDR siap jalan bro.")
-    db = SessionLocal()
-    try:
-        add_log(db, "INFO", f"Telegram test ok={ok}")
-    finally:
-        db.close()
+async def telegram_test(request: Request, username: str = Depends(require_login)):
+    # ke semua tujuan terdaftar supaya tiap chat (tim brand, ops) ikut teruji;
+    # request tidak menunggu Telegram, hasil kirim ada di log dispatcher
+    text = "✅ <b>Telegram test OK</b>\nRDR siap jalan bro."
+    key = new_key("test", request.headers.get("idempotency-key"))
+    async with AsyncSessionLocal() as db:
+        n = await enqueue_messages(db, key, {chat: [text] for chat in destinations.all_chats()}, commit=True)
+    outbox_dispatcher.wake()
+    log_event("INFO", f"Telegram test queued chats={n}")
     return RedirectResponse("/", status_code=303)
 
 @app.get("/trigger")
-async def trigger(username: str = Depends(require_login)):
-    await send_full_list_trigger(stage="MANUAL")
+async def trigger(request: Request, username: str = Depends(require_login)):
+    # isi pesan di-snapshot sekarang, pengiriman lewat outbox
+    key = new_key("full:MANUAL", request.headers.get("idempotency-key"))
+    async with AsyncSessionLocal() as db:
+        subs = await get_all_subscriptions(db)
+        n = await enqueue_messages(db, key, full_list_messages(subs, datetime.now(timezone_wib)), commit=True)
+    outbox_dispatcher.wake()
+    log_event("INFO", f"Telegram full list queued (MANUAL). chunks={n}")
     return RedirectResponse("/", status_code=303)
 
 @app.get("/health")
 async def health(username: str = Depends(require_login)):
-    return {k: str(v) for k, v in health_state.items()}
+    async with AsyncSessionLocal() as db:
+        heartbeats = await get_heartbeats(db)
+        outbox_counts = await get_outbox_counts(db)
+
+    data = {k: str(v) for k, v in health_state.items()}
+    for hb in heartbeats:
+        last = hb.last_run_at.replace(tzinfo=timezone.utc).astimezone(timezone_wib) if hb.last_run_at else None
+        data[hb.name] = {"at": str(last), "worker": hb.worker, "status": hb.status}
+    data["this_worker"] = leader.stats()
+    if leader.is_leader:
+        data["scheduler"] = scheduler.jobs()
+        data["reminder_engine"] = reminder_engine.stats()
+    data["telegram_queue"] = send_queue.stats()
+    data["telegram_destinations"] = destinations.stats()
+    data["outbox"] = {**outbox_dispatcher.stats(), "messages": outbox_counts}
+    data["dashboard_cache"] = dashboard_stats_cache.stats()
+    data["page_cache"] = page_cache.stats()
+    data["db_replicas"] = len(replica_engines)
+    data["log_buffer"] = log_buffer.stats()
+    return data
 
 
 # ===================================
-# SCHEDULER JOBS
+# METRICS (Prometheus)
 # ===================================
-scheduler = BackgroundScheduler(timezone=timezone_wib)
-
-def wrap_job(coro, key):
-    def _runner():
-        _touch_health(key)
-        asyncio.run(coro())
-    return _runner
-
-# daily 09:00 WIB
-scheduler.add_job(
-    wrap_job(send_daily_summary, "last_daily"),
-    CronTrigger(hour=9, minute=0, timezone=timezone_wib),
-    id="daily_summary_9am",
-    replace_existing=True,
-)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+DB_POOL = registry.gauge("rdr_db_pool_connections", "Koneksi pool SQLAlchemy", ("engine", "state"))
+TELEGRAM_QUEUE = registry.gauge("rdr_telegram_queue", "State antrian kirim Telegram", ("field",))
+LOG_BUFFER = registry.gauge("rdr_log_buffer", "State buffer log", ("field",))
+OUTBOX = registry.gauge("rdr_outbox_dispatcher", "Counter dispatcher outbox (proses ini)", ("field",))
+IS_LEADER = registry.gauge("rdr_is_leader", "1 kalau worker ini leader scheduler")
+
+@registry.collector
+def _collect_runtime():
+    engines = [("sync", engine), ("async", async_engine.sync_engine)]
+    engines += [(f"replica{i}", e.sync_engine) for i, e in enumerate(replica_engines)]
+    for name, eng in engines:
+        pool = eng.pool
+        if not hasattr(pool, "checkedout"):
+            continue   # NullPool / StaticPool
+        DB_POOL.set(pool.size(), engine=name, state="size")
+        DB_POOL.set(pool.checkedin(), engine=name, state="checked_in")
+        DB_POOL.set(pool.checkedout(), engine=name, state="checked_out")
+        DB_POOL.set(max(pool.overflow(), 0), engine=name, state="overflow")   # negatif = slot pool belum terpakai
+    q = send_queue.stats()
+    for field in ("depth", "in_flight", "sent", "failed", "retried", "throttled_429"):
+        TELEGRAM_QUEUE.set(q[field], field=field)
+    for field, value in log_buffer.stats().items():
+        LOG_BUFFER.set(value, field=field)
+    for field in ("sent", "retried", "failed", "errors"):
+        OUTBOX.set(outbox_dispatcher.stats()[field], field=field)
+    IS_LEADER.set(1 if leader.is_leader else 0)
+
+@app.get("/metrics")
+async def metrics(request: Request):
+    # scraper Prometheus pakai bearer token; tanpa METRICS_TOKEN wajib login
+    if METRICS_TOKEN:
+        auth = request.headers.get("authorization", "")
+        if not secrets.compare_digest(auth, f"Bearer {METRICS_TOKEN}"):
+            raise HTTPException(status_code=401)
+    else:
+        require_login(request)
+    return Response(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
-# H-3: 3x sehari
-for h in [9, 15, 21]:
-    scheduler.add_job(
-        wrap_job(send_reminders_3days, "last_h3"),
-        CronTrigger(hour=h, minute=0, timezone=timezone_wib),
-        id=f"reminder_3days_{h}",
-        replace_existing=True,
-    )
 
-# H-2: 6x sehari (tiap 4 jam)
-for h in [0, 4, 8, 12, 16, 20]:
-    scheduler.add_job(
-        wrap_job(send_reminders_2days, "last_h2"),
-        CronTrigger(hour=h, minute=0, timezone=timezone_wib),
-        id=f"reminder_2days_{h}",
-        replace_existing=True,
-    )
+# ===================================
+# JSON API
+# ===================================
+def _encode_cursor(key, row_id: int) -> str:
+    # key = expires_at (subscription) atau created_at (log)
+    raw = f"{key.isoformat()}:{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
 
-# H-1 / expired: tiap 30 menit
-for h in range(0, 24):
-    scheduler.add_job(
-        wrap_job(send_reminders_1day_or_expired, "last_h1"),
-        CronTrigger(hour=h, minute=0, timezone=timezone_wib),
-        id=f"reminder_1day_{h}_00",
-        replace_existing=True,
-    )
-    scheduler.add_job(
-        wrap_job(send_reminders_1day_or_expired, "last_h1"),
-        CronTrigger(hour=h, minute=30, timezone=timezone_wib),
-        id=f"reminder_1day_{h}_30",
-        replace_existing=True,
-    )
+def _decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        exp_str, sid = raw.split(":", 1)
+        return datetime.strptime(exp_str, "%Y-%m-%d").date(), int(sid)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor tidak valid")
+
+@app.get("/subscriptions/", response_model=SubscriptionPage)
+async def list_subscriptions(
+    username: str = Depends(require_login),
+    limit: int = Query(50, ge=1, le=500),
+    cursor: str | None = None,
+    status: str = "all",
+    brand: str | None = None,
+    archived: bool = False,
+):
+    if status not in crud.STATUS_WINDOWS:
+        raise HTTPException(status_code=400, detail=f"status harus salah satu: {', '.join(crud.STATUS_WINDOWS)}")
+
+    today = datetime.now(timezone_wib).date()
+    start, end = crud.status_window(status, today)
+    after = _decode_cursor(cursor) if cursor else None
+
+    async with AsyncSessionLocal() as db:
+        rows = await get_subscriptions_page(db, limit, after, start, end, brand, archived)
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(rows[-1].expires_at, rows[-1].id)
+    return {"items": rows, "next_cursor": next_cursor}
+
+@app.get("/subscriptions/search", response_model=list[SubscriptionOut])
+async def search(
+    q: str,
+    username: str = Depends(require_login),
+    limit: int = Query(20, ge=1, le=500),
+    archived: bool = False,
+):
+    async with AsyncSessionLocal() as db:
+        return await search_subscriptions(db, q, limit, archived)
+
+def _decode_log_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        ts_str, lid = raw.rsplit(":", 1)
+        return datetime.fromisoformat(ts_str), int(lid)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor tidak valid")
+
+@app.get("/logs/", response_model=LogPage)
+async def list_logs(
+    username: str = Depends(require_login),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: str | None = None,
+    level: list[str] | None = Query(None),
+    start: datetime | None = None,
+    end: datetime | None = None,
+):
+    # start/end tanpa timezone dianggap WIB; created_at disimpan UTC
+    after = _decode_log_cursor(cursor) if cursor else None
+    levels = [lv.upper() for lv in level] if level else None
+    async with AsyncSessionLocal() as db:
+        rows = await get_logs_page(
+            db, limit, after, levels,
+            wib_to_utc(start) if start else None,
+            wib_to_utc(end) if end else None,
+        )
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(rows[-1].created_at, rows[-1].id)
+    return {"items": rows, "next_cursor": next_cursor}
+
+@app.get("/logs/daily", response_model=list[LogDaily])
+async def log_daily(username: str = Depends(require_login), days: int = Query(30, ge=1, le=3660)):
+    since = datetime.now(timezone_wib).date() - timedelta(days=days)
+    async with AsyncSessionLocal() as db:
+        return await get_log_rollups(db, since)
+
+
+# ===================================
+# SCHEDULER JOBS
+# ===================================
+TIERS = default_tiers()
+STAGE_HEALTH_KEY = {t.stage: t.health_key for t in TIERS}
+
+async def run_tick(tiers: list[Tier], now: datetime):
+    for t in tiers:
+        await _touch_health(t.health_key)
+    if any(t.stage == "DAILY" for t in tiers):
+        await send_daily_summary()
+    if any(t.stage == "LOG-MAINT" for t in tiers):
+        await run_log_maintenance(now)
+
+async def fire_reminders(stage_ids: dict[str, list[int]], now: datetime):
+    for stage in stage_ids:
+        await _touch_health(STAGE_HEALTH_KEY[stage])
+    await send_reminders_for(stage_ids)
+
+# tier jam tetap (daily summary) lewat dispatcher
+scheduler = Dispatcher(
+    [t for t in TIERS if t.stage not in REMINDER_STAGES],
+    run_tick,
+    misfire_grace=float(os.getenv("SCHEDULER_MISFIRE_GRACE", "300")),
+)
+
+# H-3 / H-2 / H-1: event-driven, tidur sampai reminder berikutnya jatuh tempo
+reminder_engine = ReminderEngine(
+    [t for t in TIERS if t.stage in REMINDER_STAGES],
+    {stage: days for stage, (days, _) in REMINDER_STAGES.items()},
+    fire_reminders,
+    misfire_grace=float(os.getenv("SCHEDULER_MISFIRE_GRACE", "300")),
+)
+crud.on_change(reminder_engine.on_change)
+
+async def start_jobs():
+    scheduler.start()
+    reminder_engine.start()
+    logger.info(f"[SCHEDULER] OK ✅ next={scheduler.jobs()}")
+
+async def stop_jobs():
+    await reminder_engine.stop()
+    await scheduler.stop()
+    logger.info("[SCHEDULER] stop")
+
+async def leader_heartbeat():
+    await _touch_health("leader")
+
+# multi worker / replica: cuma satu proses pegang lock leader (advisory lock Postgres / flock SQLite)
+leader = LeaderElector(
+    async_engine,
+    on_elected=start_jobs,
+    on_demoted=stop_jobs,
+    lock_key=int(os.getenv("LEADER_LOCK_KEY", str(0x52445201))),
+    retry_interval=float(os.getenv("LEADER_RETRY_INTERVAL", "15")),
+    check_interval=float(os.getenv("LEADER_CHECK_INTERVAL", "10")),
+    on_heartbeat=leader_heartbeat,
+)
+change_bus = ChangeBus(async_engine)
 
-scheduler.start()
-logger.info("[SCHEDULER] OK ✅")
+_IMPORT_T1 = time.perf_counter()
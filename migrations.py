@@ -0,0 +1,146 @@
+"""Migrasi schema berversi.
+
+Versi yang sudah dipasang disimpan di tabel schema_version. Saat boot
+cukup satu SELECT; inspeksi kolom / DDL hanya jalan kalau ada migrasi
+baru. Tiap migrasi harus idempotent (IF NOT EXISTS / cek kolom) karena
+database lama yang dibuat sebelum tabel versi ada mulai dari versi 0.
+
+Di Postgres semua migrasi satu transaksi + advisory lock, jadi beberapa
+worker yang boot bersamaan tidak saling tabrak.
+"""
+import logging
+from datetime import datetime
+from typing import Callable
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+import crud
+from database import Base
+from models import ChangeEvent, OutboxMessage
+
+logger = logging.getLogger(__name__)
+
+_MIGRATION_LOCK_KEY = 0x52445202
+
+schema_version = Table(
+    "schema_version",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+# ========== Migrasi ==========
+def _m1_baseline(conn: Connection):
+    """Tabel model + kolom yang ditambahkan belakangan di tabel subscription."""
+    Base.metadata.create_all(bind=conn)
+
+    sub_cols = [c["name"] for c in inspect(conn).get_columns("subscription")]
+    required_sub_cols = [
+        "reminder_count_h3","reminder_count_h2","reminder_count_h1","reminder_count_h0",
+        "created_at","is_archived","last_notified_at","last_notified_stage"
+    ]
+    for col in required_sub_cols:
+        if col not in sub_cols:
+            if col == "created_at":
+                # SQLite tidak boleh ADD COLUMN dengan default non-konstan (NOW()),
+                # jadi isi baris lama lewat UPDATE; baris baru diisi ORM
+                conn.execute(text("ALTER TABLE subscription ADD COLUMN created_at TIMESTAMP NULL"))
+                conn.execute(text("UPDATE subscription SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL"))
+            elif col == "is_archived":
+                conn.execute(text("ALTER TABLE subscription ADD COLUMN is_archived BOOLEAN DEFAULT FALSE"))
+            elif col == "last_notified_at":
+                conn.execute(text("ALTER TABLE subscription ADD COLUMN last_notified_at TIMESTAMP NULL"))
+            elif col == "last_notified_stage":
+                conn.execute(text("ALTER TABLE subscription ADD COLUMN last_notified_stage VARCHAR NULL"))
+            else:
+                conn.execute(text(f"ALTER TABLE subscription ADD COLUMN {col} INTEGER DEFAULT 0"))
+            logger.info(f"[MIGRATE] added subscription.{col}")
+
+    # index komposit untuk query due-window reminder (tabel lama belum punya)
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_subscription_archived_expires "
+        "ON subscription (is_archived, expires_at)"
+    ))
+
+
+def _m2_log_created_at(conn: Connection):
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_log_created_at ON log (created_at, id)"))
+
+
+def _m3_search_trgm(conn: Connection):
+    # index trigram untuk search (Postgres). Savepoint: kalau user DB tidak
+    # boleh CREATE EXTENSION, migrasi tetap lanjut dan search pakai LIKE biasa.
+    if conn.dialect.name != "postgresql":
+        return
+    try:
+        with conn.begin_nested():
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_subscription_search_trgm "
+                f"ON subscription USING gin (({crud.SEARCH_EXPR}) gin_trgm_ops)"
+            ))
+    except Exception as e:
+        logger.warning(f"[MIGRATE] pg_trgm tidak tersedia, search tanpa index trigram: {e}")
+
+
+def _m4_outbox(conn: Connection):
+    OutboxMessage.__table__.create(conn, checkfirst=True)
+
+
+def _m5_change_event(conn: Connection):
+    ChangeEvent.__table__.create(conn, checkfirst=True)
+
+
+# (versi, deskripsi, fungsi) — tambah di akhir, jangan ubah urutan / nomor
+MIGRATIONS: list[tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "baseline: tabel model + kolom subscription lama + index due-window", _m1_baseline),
+    (2, "index log (created_at, id)", _m2_log_created_at),
+    (3, "pg_trgm index untuk search", _m3_search_trgm),
+    (4, "tabel outbox Telegram", _m4_outbox),
+    (5, "tabel change_event (ChangeBus SQLite)", _m5_change_event),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(conn: Connection) -> int:
+    return conn.execute(text("SELECT COALESCE(MAX(version), 0) FROM schema_version")).scalar()
+
+
+def _apply_pending(conn: Connection) -> list[int]:
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("SELECT pg_advisory_xact_lock(:k)"), {"k": _MIGRATION_LOCK_KEY})
+    schema_version.create(conn, checkfirst=True)
+
+    # dicek ulang setelah lock: worker lain mungkin baru saja selesai migrasi
+    version = current_version(conn)
+    applied = []
+    for ver, desc, fn in MIGRATIONS:
+        if ver <= version:
+            continue
+        logger.info(f"[MIGRATE] v{ver}: {desc}")
+        fn(conn)
+        conn.execute(schema_version.insert().values(
+            version=ver, description=desc, applied_at=datetime.utcnow(),
+        ))
+        applied.append(ver)
+    return applied
+
+
+async def run_migrations(engine: AsyncEngine) -> list[int]:
+    """Pasang migrasi yang belum ada; return versi yang baru dipasang."""
+    try:
+        async with engine.connect() as conn:
+            if await conn.run_sync(current_version) >= LATEST_VERSION:
+                return []
+    except Exception:
+        pass   # tabel schema_version belum ada (database baru / lama)
+
+    async with engine.begin() as conn:
+        applied = await conn.run_sync(_apply_pending)
+    if applied:
+        logger.info(f"[MIGRATE] schema v{applied[-1]} ✅ (dipasang: {applied})")
+    return applied
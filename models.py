@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Date, DateTime, Boolean
+from sqlalchemy import Column, Integer, String, Text, Date, DateTime, Boolean, Index
 from datetime import datetime
 from database import Base
 
@@ -24,6 +24,20 @@ class Subscription(Base):
     last_notified_at = Column(DateTime, nullable=True)
     last_notified_stage = Column(String, nullable=True)  # "H-3","H-2","H-1/EXPIRED","DAILY"
 
+    __table_args__ = (
+        # scan reminder: WHERE is_archived = false AND expires_at BETWEEN ...
+        Index("ix_subscription_archived_expires", "is_archived", "expires_at"),
+    )
+
+
+class JobHeartbeat(Base):
+    __tablename__ = "job_heartbeat"
+
+    name = Column(String, primary_key=True)   # "last_daily", "last_h3", ..., "leader"
+    last_run_at = Column(DateTime, nullable=True)
+    worker = Column(String, nullable=True)
+    status = Column(String, nullable=True)
+
 
 class LogEntry(Base):
     __tablename__ = "log"
@@ -32,3 +46,58 @@ class LogEntry(Base):
     level = Column(String, default="INFO")
     message = Column(String, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # log terbaru (dashboard, API log) dan prune by created_at
+        Index("ix_log_created_at", "created_at", "id"),
+    )
+
+
+class LogDaily(Base):
+    """Rekap jumlah log per hari (WIB) per level; tetap ada setelah log di-prune."""
+    __tablename__ = "log_daily"
+
+    day = Column(Date, primary_key=True)
+    level = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class OutboxMessage(Base):
+    """Pesan Telegram yang menunggu dikirim dispatcher (lihat outbox.py).
+
+    Satu baris = satu chunk ke satu chat. idempotency_key unik: enqueue
+    ulang dengan key yang sama diabaikan.
+    """
+    __tablename__ = "outbox"
+
+    id = Column(Integer, primary_key=True)
+    idempotency_key = Column(String, nullable=False, unique=True)
+    chat_id = Column(String, nullable=False)
+    text = Column(Text, nullable=False)
+    status = Column(String, nullable=False, default="pending")   # pending / sending / sent / failed
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    locked_until = Column(DateTime, nullable=True)
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # dispatcher: WHERE status = 'pending' AND next_attempt_at <= now ORDER BY id
+        Index("ix_outbox_status_next", "status", "next_attempt_at"),
+    )
+
+
+class ChangeEvent(Base):
+    """Event crud.on_change untuk worker lain di backend SQLite (ChangeBus
+    polling tabel ini; Postgres pakai LISTEN/NOTIFY)."""
+    __tablename__ = "change_event"
+
+    id = Column(Integer, primary_key=True)
+    worker = Column(String, nullable=False)
+    payload = Column(Text, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    # AUTOINCREMENT: id tidak dipakai ulang setelah baris lama dihapus,
+    # jadi "id > terakhir dibaca" tidak pernah melewatkan event
+    __table_args__ = {"sqlite_autoincrement": True}
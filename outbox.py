@@ -0,0 +1,213 @@
+"""Outbox transaksional untuk pesan Telegram dari web request.
+
+Route tidak lagi menunggu Telegram: pesan ditulis ke tabel outbox di
+transaksi yang sama dengan perubahan datanya (enqueue tanpa commit, lalu
+commit crud biasa), request langsung redirect, dan OutboxDispatcher di
+background yang mengirim.
+
+Exactly-once:
+- enqueue: idempotency_key unik per chunk per chat, key ganda diabaikan
+  (submit ganda / retry request tidak menggandakan pesan).
+- kirim: pesan di-claim dengan lease (Postgres: SKIP LOCKED, aman untuk
+  banyak worker) dan ditandai 'sent' begitu Telegram membalas ok. Lease
+  berlaku per pesan, bukan per batch: sebelum tiap kirim, lease sisa chunk
+  chat itu diperpanjang lease_seconds, hanya kalau masih dipegang worker
+  ini. Chat grup yang lambat (20/menit, 429) tidak membuat lease batch habis
+  di tengah kirim; kalau lease ternyata sudah lepas, worker berhenti dan
+  tidak mengirim pesan yang mungkin sudah di-claim worker lain. Bot API
+  tidak punya idempotency key, jadi satu-satunya celah duplikat adalah
+  proses mati tepat di antara balasan ok dan update status; pesan itu
+  dikirim ulang setelah lease habis.
+
+Gagal kirim (setelah retry di TelegramSendQueue) dicoba lagi dengan
+backoff sampai OUTBOX_MAX_ATTEMPTS, lalu status 'failed'. Urutan per chat
+dijaga: kalau satu chunk gagal, chunk berikutnya ke chat itu (di batch yang
+sama) ikut menunggu jadwal retry-nya.
+"""
+import asyncio
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Iterable
+
+from database import AsyncSessionLocal
+from crud_async import (
+    enqueue_outbox, claim_outbox, mark_outbox_sent, mark_outbox_failed,
+    renew_outbox_lease, release_outbox, prune_outbox,
+)
+from destinations import FANOUT_CONCURRENCY
+from telegram_bot import send_queue
+
+logger = logging.getLogger(__name__)
+
+
+def new_key(prefix: str, client_key: str | None = None) -> str:
+    """Key dasar pesan; pakai header Idempotency-Key dari client kalau ada."""
+    return f"{prefix}:{client_key or uuid.uuid4().hex}"
+
+
+def message_rows(key: str, messages: dict[str, Iterable[str]]) -> list[dict]:
+    """chat -> chunk  ==>  baris outbox dengan key '<key>:<chat>:<n>'."""
+    return [
+        {"idempotency_key": f"{key}:{chat}:{i}", "chat_id": chat, "text": text}
+        for chat, chunks in messages.items()
+        for i, text in enumerate(chunks)
+    ]
+
+
+async def enqueue_messages(db, key: str, messages: dict[str, Iterable[str]], commit: bool = False) -> int:
+    return await enqueue_outbox(db, message_rows(key, messages), commit)
+
+
+class OutboxDispatcher:
+    def __init__(
+        self,
+        poll_interval: float = 5.0,
+        batch_size: int = 50,
+        max_attempts: int = 8,
+        lease_seconds: float = 300.0,
+        backoff_base: float = 30.0,
+        backoff_max: float = 3600.0,
+        retention_days: int = 7,
+        concurrency: int = FANOUT_CONCURRENCY,
+    ):
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retention_days = retention_days
+        self.concurrency = concurrency
+
+        self._task: asyncio.Task | None = None
+        self._wake: asyncio.Event | None = None
+        self._stopping = False
+        self._last_prune = 0.0
+        self._stats = {"sent": 0, "retried": 0, "failed": 0, "errors": 0}
+
+    # ---------- lifecycle ----------
+    def start(self):
+        if self._task and not self._task.done():
+            return
+        self._stopping = False
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="outbox-dispatcher")
+
+    async def stop(self, timeout: float = 10.0):
+        # selesaikan pesan yang sedang dikirim, sisa claim dikembalikan ke pending
+        if not self._task:
+            return
+        task, self._task = self._task, None
+        self._stopping = True
+        self.wake()
+        try:
+            await asyncio.wait_for(asyncio.shield(task), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning("[OUTBOX] stop timeout, pesan yang di-claim menunggu lease habis")
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    def wake(self):
+        """Dipanggil route setelah commit supaya pesan baru langsung dikirim."""
+        if self._wake is not None:
+            self._wake.set()
+
+    def stats(self) -> dict:
+        return {"running": bool(self._task), **self._stats}
+
+    # ---------- internals ----------
+    async def _run(self):
+        while not self._stopping:
+            self._wake.clear()
+            try:
+                await self.drain()
+                await self._maybe_prune()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._stats["errors"] += 1
+                logger.error(f"[OUTBOX] drain error: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def drain(self) -> int:
+        """Kirim semua pesan yang jatuh tempo; return jumlah yang terkirim."""
+        sent = 0
+        while not self._stopping:
+            now = datetime.utcnow()
+            async with AsyncSessionLocal() as db:
+                rows = await claim_outbox(db, now, self.batch_size, now + timedelta(seconds=self.lease_seconds))
+            if not rows:
+                return sent
+
+            by_chat: dict[str, list] = {}
+            for row in rows:
+                by_chat.setdefault(row.chat_id, []).append(row)
+            sem = asyncio.Semaphore(max(1, self.concurrency))
+            results = await asyncio.gather(*(self._send_chat(sem, chat_rows) for chat_rows in by_chat.values()))
+            sent += sum(results)
+            if len(rows) < self.batch_size:
+                break
+        return sent
+
+    async def _send_chat(self, sem: asyncio.Semaphore, rows: list) -> int:
+        sent = 0
+        async with sem, AsyncSessionLocal() as db:
+            lease = rows[0].locked_until
+            for i, row in enumerate(rows):
+                if self._stopping:
+                    await release_outbox(db, [r.id for r in rows[i:]])
+                    break
+                # lease dihitung dari pesan terakhir, bukan dari claim batch
+                ids = [r.id for r in rows[i:]]
+                new_lease = datetime.utcnow() + timedelta(seconds=self.lease_seconds)
+                if await renew_outbox_lease(db, ids, lease, new_lease) < len(ids):
+                    self._stats["errors"] += 1
+                    logger.error(f"[OUTBOX] lease chat={row.chat_id} lepas, sisa {len(ids)} pesan tidak dikirim")
+                    break
+                lease = new_lease
+                if await send_queue.send(row.chat_id, row.text):
+                    await mark_outbox_sent(db, row.id)
+                    self._stats["sent"] += 1
+                    sent += 1
+                    continue
+
+                retry_at = None
+                if row.attempts >= self.max_attempts:
+                    self._stats["failed"] += 1
+                    logger.error(f"[OUTBOX] menyerah id={row.id} chat={row.chat_id} setelah {row.attempts}x")
+                else:
+                    delay = min(self.backoff_max, self.backoff_base * 2 ** (row.attempts - 1))
+                    retry_at = datetime.utcnow() + timedelta(seconds=delay)
+                    self._stats["retried"] += 1
+                    logger.warning(f"[OUTBOX] gagal id={row.id} chat={row.chat_id}, retry {delay:.0f}s")
+                await mark_outbox_failed(db, row.id, "telegram send failed", retry_at)
+                # chunk berikutnya ke chat ini ikut menunggu supaya urutan tetap
+                rest = [r.id for r in rows[i + 1:]]
+                if rest:
+                    await release_outbox(db, rest, retry_at)
+                break
+        return sent
+
+    async def _maybe_prune(self):
+        if self.retention_days <= 0 or time.monotonic() - self._last_prune < 3600:
+            return
+        self._last_prune = time.monotonic()
+        async with AsyncSessionLocal() as db:
+            n = await prune_outbox(db, datetime.utcnow() - timedelta(days=self.retention_days))
+        if n:
+            logger.info(f"[OUTBOX] prune {n} pesan terkirim (retensi {self.retention_days} hari)")
+
+
+outbox_dispatcher = OutboxDispatcher(
+    poll_interval=float(os.getenv("OUTBOX_POLL_INTERVAL", "5")),
+    batch_size=int(os.getenv("OUTBOX_BATCH_SIZE", "50")),
+    max_attempts=int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8")),
+    lease_seconds=float(os.getenv("OUTBOX_LEASE_SECONDS", "300")),
+    retention_days=int(os.getenv("OUTBOX_RETENTION_DAYS", "7")),
+)
@@ -0,0 +1,225 @@
+"""Engine reminder berbasis event (min-heap next-due).
+
+Tiap subscription aktif yang bisa kena reminder hari ini/besok punya satu
+entry di heap: (waktu notif berikutnya, id, stage). Engine tidur sampai
+entry paling awal, mengirim semua yang jatuh tempo dalam satu batch per
+stage, lalu menjadwalkan ulang id tersebut ke slot berikutnya.
+
+Heap hanya menampung horizon hari ini + besok, dan dibangun ulang tiap
+tengah malam WIB lewat query due-window. Entry yang sudah jatuh tempo
+(slot 00:00) dikirim dulu sebelum heap dibangun ulang. Saat start (boot /
+jadi leader) heap dibangun dari `now - misfire_grace`, jadi slot yang baru
+saja terlewat tetap dikirim sekali, sama seperti tier di Dispatcher. Mutasi di crud.py (create,
+update, renew, archive, delete) memanggil on_change sehingga entry id
+terkait dihitung ulang tanpa polling tabel.
+"""
+import asyncio
+import heapq
+import logging
+from datetime import date, datetime, timedelta
+from typing import Awaitable, Callable
+from zoneinfo import ZoneInfo
+
+from database import AsyncSessionLocal, use_primary
+from crud_async import get_due_subscriptions, get_subscriptions_by_ids
+from scheduler_logic import Tier
+
+logger = logging.getLogger(__name__)
+timezone_wib = ZoneInfo("Asia/Jakarta")
+
+
+class ReminderEngine:
+    def __init__(
+        self,
+        tiers: list[Tier],
+        stage_days: dict[str, list[int]],
+        fire: Callable[[dict[str, list[int]], datetime], Awaitable[None]],
+        misfire_grace: float = 300,
+    ):
+        self.tiers = {t.stage: t for t in tiers if t.stage in stage_days}
+        self._stage_by_days = {d: stage for stage, days in stage_days.items() for d in days}
+        self.min_days = min(self._stage_by_days)
+        self.max_days = max(self._stage_by_days)
+        self._fire = fire
+        self.misfire_grace = timedelta(seconds=misfire_grace)
+
+        self._heap: list[tuple[datetime, int, int, str]] = []
+        self._gen: dict[int, int] = {}          # id -> generasi entry yang masih valid
+        self._horizon: datetime | None = None   # entry >= horizon tidak disimpan
+        self._pending: set[int] = set()
+        self._rebuild = True
+        self._wake = asyncio.Event()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._task: asyncio.Task | None = None
+
+    # ---------- lifecycle ----------
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()   # lifespan baru bisa jalan di event loop lain
+        # heap dari periode leader sebelumnya basi: mulai dari kosong
+        self._heap = []
+        self._horizon = None
+        self._rebuild = True
+        self._task = asyncio.create_task(self._run(), name="reminder-engine")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        self._loop = None
+
+    def stats(self) -> dict:
+        live = [e for e in self._heap if self._gen.get(e[1]) == e[2]]
+        return {
+            "running": self.running,
+            "scheduled": len(live),
+            "next_fire": str(min(live)[0]) if live else None,
+            "horizon": str(self._horizon),
+        }
+
+    # ---------- hook dari crud.on_change ----------
+    def on_change(self, table: str, ids: list[int] | None):
+        if table != "subscription" or self._loop is None:
+            return
+        # crud bisa dipanggil dari thread lain (run_sync / script)
+        self._loop.call_soon_threadsafe(self._mark_dirty, ids)
+
+    def _mark_dirty(self, ids: list[int] | None):
+        if ids is None:
+            self._rebuild = True
+        else:
+            self._pending.update(ids)
+        self._wake.set()
+
+    # ---------- jadwal ----------
+    def stage_for(self, days_left: int) -> str | None:
+        return self._stage_by_days.get(days_left)
+
+    def next_fire(self, expires_at: date, after: datetime) -> tuple[datetime, str] | None:
+        """Slot notif pertama > after untuk subscription dengan expires_at ini."""
+        day = max(after.date(), expires_at - timedelta(days=self.max_days))
+        while True:
+            days_left = (expires_at - day).days
+            if days_left < self.min_days:
+                return None
+            stage = self.stage_for(days_left)
+            if stage:
+                for slot in sorted(self.tiers[stage].slots_on(day)):
+                    if slot > after:
+                        return slot, stage
+            day += timedelta(days=1)
+
+    def _schedule(self, sub, after: datetime):
+        gen = self._gen.get(sub.id, 0) + 1
+        self._gen[sub.id] = gen
+        if sub.is_archived:
+            return
+        nxt = self.next_fire(sub.expires_at, after)
+        if nxt and nxt[0] < self._horizon:
+            heapq.heappush(self._heap, (nxt[0], sub.id, gen, nxt[1]))
+
+    def _drop(self, sub_id: int):
+        self._gen[sub_id] = self._gen.get(sub_id, 0) + 1
+
+    async def _rebuild_heap(self, now: datetime, after: datetime):
+        """Bangun ulang heap; slot > after dijadwalkan (after <= now)."""
+        today = now.date()
+        self._horizon = datetime(today.year, today.month, today.day, tzinfo=timezone_wib) + timedelta(days=2)
+        self._heap = []
+        self._gen = {}
+        self._pending.clear()
+        async with AsyncSessionLocal() as db:
+            # yang bisa kena notif hari ini atau besok
+            subs = await get_due_subscriptions(
+                db,
+                today + timedelta(days=self.min_days),
+                today + timedelta(days=self.max_days + 1),
+            )
+        for sub in subs:
+            self._schedule(sub, after)
+        logger.info(f"[ENGINE] rebuild: {len(self._heap)} jadwal s/d {self._horizon:%d %b %H:%M}")
+
+    async def _refresh(self, ids: set[int], now: datetime):
+        # dipicu perubahan barusan: replica bisa belum tersusul
+        with use_primary():
+            async with AsyncSessionLocal() as db:
+                subs = await get_subscriptions_by_ids(db, list(ids))
+        found = {s.id for s in subs}
+        for sub_id in ids - found:
+            self._drop(sub_id)     # sudah dihapus
+        for sub in subs:
+            self._schedule(sub, now)
+
+    def _pop_due(self, now: datetime) -> dict[str, list[int]]:
+        due: dict[str, list[int]] = {}
+        while self._heap and self._heap[0][0] <= now:
+            _, sub_id, gen, stage = heapq.heappop(self._heap)
+            if self._gen.get(sub_id) != gen:
+                continue   # entry basi (sudah dijadwal ulang / dihapus)
+            due.setdefault(stage, []).append(sub_id)
+            self._drop(sub_id)
+        return due
+
+    def _next_wake(self) -> datetime:
+        while self._heap and self._gen.get(self._heap[0][1]) != self._heap[0][2]:
+            heapq.heappop(self._heap)
+        # rebuild tiap tengah malam (horizon - 1 hari)
+        rollover = self._horizon - timedelta(days=1)
+        return min(self._heap[0][0], rollover) if self._heap else rollover
+
+    # ---------- loop ----------
+    async def _tick(self, now: datetime) -> dict[str, list[int]]:
+        """Rebuild / refresh kalau perlu, lalu return id yang jatuh tempo."""
+        if self._rebuild or self._horizon is None or now >= self._horizon - timedelta(days=1):
+            self._rebuild = False
+            if self._horizon is None:
+                # boot / baru jadi leader: slot yang baru lewat masih dikirim
+                due, after = {}, now - self.misfire_grace
+            else:
+                # tengah malam / reload penuh: kirim dulu yang sudah jatuh tempo
+                # (slot 00:00), heap baru mulai setelah now supaya tidak dobel
+                due, after = self._pop_due(now), now
+            await self._rebuild_heap(now, after)
+            for stage, ids in self._pop_due(now).items():
+                due.setdefault(stage, []).extend(ids)
+            return due
+        if self._pending:
+            ids, self._pending = self._pending, set()
+            await self._refresh(ids, now)
+        return self._pop_due(now)
+
+    async def _run(self):
+        while True:
+            try:
+                now = datetime.now(timezone_wib)
+                due = await self._tick(now)
+                if due:
+                    try:
+                        await self._fire(due, now)
+                    finally:
+                        # jadwalkan ulang ke slot berikutnya (data segar dari DB)
+                        await self._refresh({i for ids in due.values() for i in ids}, now)
+                    continue
+
+                delay = (self._next_wake() - now).total_seconds()
+                self._wake.clear()
+                if self._pending or self._rebuild:
+                    continue
+                try:
+                    # tidur sampai jadwal terdekat, atau dibangunkan on_change
+                    await asyncio.wait_for(self._wake.wait(), timeout=max(delay, 0) + 0.01)
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[ENGINE] error: {e}")
+                await asyncio.sleep(30)
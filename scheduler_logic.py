@@ -1,15 +1,128 @@
-from sqlalchemy.orm import Session
-from . import crud, telegram_bot
-
-async def check_and_send_reminders(db: Session):
-    # Cek yang expired dalam 3 hari
-    subs_3d = crud.get_expiring_soon(db, 3)
-    for sub in subs_3d:
-        msg = f"🚨 Reminder: '{sub.name}' ({sub.url}) expires in 3 days! ({sub.expires_at})"
-        await telegram_bot.send_telegram_message(msg)
-
-    # Cek yang expired besok
-    subs_1d = crud.get_expiring_soon(db, 1)
-    for sub in subs_1d:
-        msg = f"🔥 URGENT: '{sub.name}' ({sub.url}) expires TOMORROW! ({sub.expires_at})"
-        await telegram_bot.send_telegram_message(msg)
\ No newline at end of file
+"""Scheduler async yang jalan di event loop app (pengganti APScheduler).
+
+Satu task dispatcher menghitung slot berikutnya untuk tiap tier, tidur
+sampai slot terdekat, lalu menjalankan semua tier yang jatuh tempo dalam
+satu pass. Slot yang terlewat digabung (coalesce) jadi satu run selama
+masih dalam misfire grace; lewat dari itu di-skip dan dicatat.
+"""
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable
+from zoneinfo import ZoneInfo
+
+logger = logging.getLogger(__name__)
+timezone_wib = ZoneInfo("Asia/Jakarta")
+
+
+@dataclass
+class Tier:
+    stage: str                 # "DAILY", "H-3", "H-2", "H-1/EXPIRED", "LOG-MAINT"
+    health_key: str            # key di health_state
+    hours: tuple[int, ...]
+    minutes: tuple[int, ...] = (0,)
+    next_run: datetime | None = None
+
+    def slots_on(self, day) -> list[datetime]:
+        return [
+            datetime(day.year, day.month, day.day, h, m, tzinfo=timezone_wib)
+            for h in self.hours for m in self.minutes
+        ]
+
+    def next_slot(self, after: datetime) -> datetime:
+        """Slot pertama yang > after."""
+        day = after.date()
+        for offset in (0, 1):
+            for slot in sorted(self.slots_on(day + timedelta(days=offset))):
+                if slot > after:
+                    return slot
+        raise ValueError(f"tier {self.stage} tanpa slot")
+
+    def last_slot(self, at: datetime) -> datetime:
+        """Slot terakhir yang <= at."""
+        day = at.date()
+        for offset in (0, 1):
+            for slot in sorted(self.slots_on(day - timedelta(days=offset)), reverse=True):
+                if slot <= at:
+                    return slot
+        raise ValueError(f"tier {self.stage} tanpa slot")
+
+
+def default_tiers() -> list[Tier]:
+    return [
+        # daily 09:00 WIB
+        Tier("DAILY", "last_daily", hours=(9,)),
+        # H-3: 3x sehari
+        Tier("H-3", "last_h3", hours=(9, 15, 21)),
+        # H-2: 6x sehari (tiap 4 jam)
+        Tier("H-2", "last_h2", hours=(0, 4, 8, 12, 16, 20)),
+        # H-1 / expired: tiap 30 menit
+        Tier("H-1/EXPIRED", "last_h1", hours=tuple(range(24)), minutes=(0, 30)),
+        # rekap + retensi tabel log, 03:00 WIB
+        Tier("LOG-MAINT", "last_log_maint", hours=(3,)),
+    ]
+
+
+class Dispatcher:
+    def __init__(
+        self,
+        tiers: list[Tier],
+        run: Callable[[list[Tier], datetime], Awaitable[None]],
+        misfire_grace: float = 300,
+        max_sleep: float = 60,
+    ):
+        self.tiers = tiers
+        self._run = run
+        self.misfire_grace = timedelta(seconds=misfire_grace)
+        self.max_sleep = max_sleep
+        self._task: asyncio.Task | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if self.running:
+            return
+        now = datetime.now(timezone_wib)
+        for t in self.tiers:
+            t.next_run = t.next_slot(now)
+        self._task = asyncio.create_task(self._loop(), name="scheduler-dispatcher")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    def jobs(self) -> dict[str, str]:
+        return {t.stage: str(t.next_run) for t in self.tiers}
+
+    async def _loop(self):
+        while True:
+            now = datetime.now(timezone_wib)
+            due = [t for t in self.tiers if t.next_run <= now]
+            if not due:
+                wake = min(t.next_run for t in self.tiers)
+                # sleep dipotong max_sleep supaya tahan jam sistem yang lompat
+                await asyncio.sleep(min((wake - now).total_seconds(), self.max_sleep))
+                continue
+
+            run_now = []
+            for t in due:
+                # semua slot yang terlewat dilebur ke slot terakhir (coalesce)
+                slot = t.last_slot(now)
+                if now - slot <= self.misfire_grace:
+                    run_now.append(t)
+                else:
+                    logger.warning(f"[SCHEDULER] {t.stage} slot {slot:%H:%M} terlewat, skip")
+                t.next_run = t.next_slot(now)
+
+            if not run_now:
+                continue
+            try:
+                await self._run(run_now, now)
+            except Exception as e:
+                logger.error(f"[SCHEDULER] tick error {[t.stage for t in run_now]}: {e}")
@@ -20,6 +20,11 @@ class Subscription(SubscriptionCreate):
         from_attributes = True
 
 
+class SubscriptionPage(BaseModel):
+    items: list[Subscription]
+    next_cursor: str | None = None
+
+
 class LogEntry(BaseModel):
     id: int
     level: str
@@ -28,3 +33,17 @@ class LogEntry(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class LogPage(BaseModel):
+    items: list[LogEntry]
+    next_cursor: str | None = None
+
+
+class LogDaily(BaseModel):
+    day: date
+    level: str
+    count: int
+
+    class Config:
+        from_attributes = True
@@ -1,20 +1,43 @@
 import os
+import re
+import time
 import httpx
 import logging
 from datetime import datetime
 from zoneinfo import ZoneInfo
 from collections import defaultdict
-from typing import Iterable
+from typing import Callable, Iterable, Iterator
 import html
 
-from database import SessionLocal
-from crud import get_all_subscriptions, set_last_notified, add_log
+from crud import brand_key
+from database import AsyncSessionLocal
+from destinations import DeliveryResult, destinations, fan_out, summarize
+from telegram_queue import SendResult, TelegramSendQueue
+from crud_async import (
+    get_all_subscriptions, get_subscriptions_by_ids,
+    mark_notified,
+)
+from log_buffer import log_event
+from metrics import (
+    JOB_DURATION, JOB_MATCHED, JOB_LAST_MATCHED,
+    TELEGRAM_SEND_LATENCY, TELEGRAM_SENDS, telegram_outcome,
+)
 
 logger = logging.getLogger(__name__)
 timezone_wib = ZoneInfo("Asia/Jakarta")
 
 TELEGRAM_MAX_LEN = 3500
 
+# base URL bisa diarahkan ke mock Bot API lokal (test / benchmark)
+TELEGRAM_API_BASE = os.getenv("TELEGRAM_API_BASE", "https://api.telegram.org").rstrip("/")
+TELEGRAM_TIMEOUT = float(os.getenv("TELEGRAM_TIMEOUT", "30"))
+TELEGRAM_CONNECT_TIMEOUT = float(os.getenv("TELEGRAM_CONNECT_TIMEOUT", "10"))
+TELEGRAM_MAX_CONNECTIONS = int(os.getenv("TELEGRAM_MAX_CONNECTIONS", "10"))
+TELEGRAM_KEEPALIVE_EXPIRY = float(os.getenv("TELEGRAM_KEEPALIVE_EXPIRY", "60"))
+TELEGRAM_HTTP2 = os.getenv("TELEGRAM_HTTP2", "1") == "1"
+
+_http_client: httpx.AsyncClient | None = None
+
 
 def html_escape(s: str) -> str:
     return html.escape(s or "")
@@ -24,15 +47,6 @@ def _to_date(value):
     return value.date() if hasattr(value, "date") else value
 
 
-def _chunks(text: str, size: int = TELEGRAM_MAX_LEN) -> Iterable[str]:
-    for i in range(0, len(text), size):
-        yield text[i:i + size]
-
-
-def _allowed_minute(windows: set[int]) -> bool:
-    return datetime.now(timezone_wib).minute in windows
-
-
 def _format_remaining(days_left: int) -> tuple[str, str]:
     if days_left < 0:
         expired_days = abs(days_left)
@@ -44,6 +58,16 @@ def _format_remaining(days_left: int) -> tuple[str, str]:
     return f"({days_left} hari lagi)", ""
 
 
+def _reminder_counter(days_left: int) -> str:
+    if days_left >= 3:
+        return "reminder_count_h3"
+    if days_left == 2:
+        return "reminder_count_h2"
+    if days_left == 1:
+        return "reminder_count_h1"
+    return "reminder_count_h0"
+
+
 def _default_emoji(days_left: int) -> str:
     if days_left <= 1:
         return "💀"
@@ -56,14 +80,198 @@ def _default_emoji(days_left: int) -> str:
     return "✅"
 
 
-async def send_telegram_message(text: str) -> bool:
-    token = os.getenv("TELEGRAM_BOT_TOKEN")
-    chat_id = os.getenv("TELEGRAM_CHAT_ID")
-    if not token or not chat_id:
-        logger.error("[TELEGRAM] Token/Chat ID kosong.")
-        return False
+def _format_item(i: int, name: str, url: str | None, exp_date, days_left: int) -> str:
+    parts = [f"{i}. <b>{html_escape(name)}</b>\n"]
+    if url:
+        safe_url = html_escape(url)
+        parts.append(f"🔗 <a href='{safe_url}'>{safe_url}</a>\n")
+
+    remaining_text, emoji_override = _format_remaining(days_left)
+    emoji = emoji_override or _default_emoji(days_left)
+    parts.append(f"Expire: {exp_date.strftime('%d %B %Y')} {remaining_text} {emoji}\n\n")
+    return "".join(parts)
+
+
+# =========================================================
+# MESSAGE BUILDER (chunk aman HTML)
+# =========================================================
+# tag, entity, atau teks biasa; tag dan entity tidak pernah dipotong
+_HTML_TOKEN = re.compile(r"<[^>]*>|&#?\w+;|[^<&]+|[<&]")
+
+
+def _split_oversized(block: str, limit: int) -> Iterator[str]:
+    """Potong satu blok HTML yang lebih panjang dari limit.
+
+    Potongan hanya di teks biasa, tidak di dalam tag / entity. Tag yang
+    masih terbuka ditutup di akhir potongan dan dibuka lagi di potongan
+    berikutnya, jadi tiap potongan tetap HTML valid dan <= limit.
+    """
+    open_tags: list[tuple[str, str]] = []   # (nama, tag pembuka)
+    parts: list[str] = []
+    size = 0
+    closing_len = 0
+
+    def flush() -> str:
+        nonlocal parts, size
+        chunk = "".join(parts) + "".join(f"</{name}>" for name, _ in reversed(open_tags))
+        parts = [tag for _, tag in open_tags]
+        size = sum(len(tag) for tag in parts)
+        return chunk
+
+    for m in _HTML_TOKEN.finditer(block):
+        token = m.group()
+        if token.startswith("</"):
+            name = token[2:-1].strip().lower()
+            if open_tags and open_tags[-1][0] == name:
+                open_tags.pop()
+                closing_len -= len(f"</{name}>")
+            parts.append(token)
+            size += len(token)
+            continue
+        if token.startswith("<") and len(token) > 1:
+            name = token[1:-1].split(None, 1)[0].lower()
+            extra = len(f"</{name}>")
+            if size + len(token) + closing_len + extra > limit:
+                yield flush()
+            open_tags.append((name, token))
+            closing_len += extra
+            parts.append(token)
+            size += len(token)
+            continue
+        # entity ("&amp;") atomik, teks biasa boleh dipotong di mana saja
+        atomic = token.startswith("&") and len(token) > 1
+        while token:
+            room = limit - size - closing_len
+            if room < (len(token) if atomic else 1):
+                yield flush()
+                room = max(limit - size - closing_len, 1)
+            piece = token if atomic else token[:room]
+            parts.append(piece)
+            size += len(piece)
+            token = token[len(piece):]
+
+    if parts:
+        yield "".join(parts)
+
+
+def iter_message_chunks(
+    header: str,
+    groups: Iterable[tuple[str, Iterable[str]]],
+    footer: str = "",
+    brand_separator: str = "",
+    limit: int = TELEGRAM_MAX_LEN,
+) -> Iterator[str]:
+    """Susun pesan dari (brand, [item_html, ...]) dan yield per chunk.
+
+    Chunk hanya dipotong di batas item/brand, jadi tiap chunk tetap HTML
+    valid untuk Telegram. Kalau satu brand terpotong, chunk berikutnya
+    diawali judul brand "(lanjutan)". Item yang sendirian sudah lebih
+    panjang dari limit dipotong dengan _split_oversized. Teks disusun
+    dengan list + join (bukan `msg +=`) sehingga linear terhadap jumlah item.
+    """
+    parts: list[str] = []
+    size = 0
+
+    def fits(block: str) -> bool:
+        return not parts or size + len(block) <= limit
+
+    def take() -> str:
+        nonlocal parts, size
+        chunk = "".join(parts)
+        parts, size = [], 0
+        return chunk
+
+    def put(block: str):
+        nonlocal size
+        parts.append(block)
+        size += len(block)
+
+    put(header)
+    for brand, items in groups:
+        brand_head = f"<b>{html_escape(brand)}</b>\n"
+        started = False
+        for item in items:
+            # judul brand selalu ikut item pertamanya, tidak pernah yatim di akhir chunk
+            block = item if started else brand_head + item
+            if not fits(block):
+                yield take()
+                if started:
+                    block = f"<b>{html_escape(brand)}</b> <i>(lanjutan)</i>\n" + item
+            if len(block) > limit:
+                if parts:
+                    yield take()
+                *full, block = _split_oversized(block, limit)
+                yield from full
+            put(block)
+            started = True
+        if started and brand_separator and fits(brand_separator):
+            put(brand_separator)
+
+    if footer:
+        if not fits(footer):
+            yield take()
+        put(footer)
+
+    if parts:
+        yield take()
+
+
+# =========================================================
+# HTTP CLIENT (shared, keep-alive)
+# =========================================================
+def _build_http_client() -> httpx.AsyncClient:
+    http2 = TELEGRAM_HTTP2
+    if http2:
+        try:
+            import h2  # noqa: F401  (httpx[http2])
+        except ImportError:
+            logger.warning("[TELEGRAM] paket h2 tidak ada, fallback ke HTTP/1.1")
+            http2 = False
+
+    return httpx.AsyncClient(
+        base_url=TELEGRAM_API_BASE,
+        http2=http2,
+        timeout=httpx.Timeout(TELEGRAM_TIMEOUT, connect=TELEGRAM_CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=TELEGRAM_MAX_CONNECTIONS,
+            max_keepalive_connections=TELEGRAM_MAX_CONNECTIONS,
+            keepalive_expiry=TELEGRAM_KEEPALIVE_EXPIRY,
+        ),
+    )
+
+
+def get_http_client() -> httpx.AsyncClient:
+    # dibuat lazy supaya tetap jalan di luar lifespan (script, test)
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = _build_http_client()
+    return _http_client
+
+
+async def start_http_client() -> httpx.AsyncClient:
+    """Dipanggil dari lifespan app; satu client untuk route + scheduler."""
+    return get_http_client()
+
+
+async def close_http_client():
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+async def _post_message(chat_id: str, text: str) -> SendResult:
+    start = time.perf_counter()
+    res = await _post_message_raw(chat_id, text)
+    outcome = telegram_outcome(res.ok, res.status)
+    TELEGRAM_SEND_LATENCY.observe(time.perf_counter() - start, outcome=outcome)
+    TELEGRAM_SENDS.inc(outcome=outcome)
+    return res
 
-    url = f"https://api.telegram.org/bot{token}/sendMessage"
+
+async def _post_message_raw(chat_id: str, text: str) -> SendResult:
+    token = os.getenv("TELEGRAM_BOT_TOKEN")
+    url = f"/bot{token}/sendMessage"
     payload = {
         "chat_id": chat_id,
         "text": text,
@@ -72,141 +280,208 @@ async def send_telegram_message(text: str) -> bool:
     }
 
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            r = await client.post(url, json=payload)
-        return bool(r.json().get("ok"))
-    except Exception as e:
-        logger.error(f"[TELEGRAM] Error: {e}")
-        return False
+        r = await get_http_client().post(url, json=payload)
+    except httpx.HTTPError as e:
+        return SendResult(ok=False, description=f"{type(e).__name__}: {e}")
+
+    try:
+        data = r.json()
+    except ValueError:
+        data = {}
+    params = data.get("parameters") or {}
+    return SendResult(
+        ok=bool(data.get("ok")),
+        status=r.status_code,
+        retry_after=params.get("retry_after"),
+        description=data.get("description") or r.reason_phrase,
+    )
+
+
+# =========================================================
+# SEND QUEUE (rate limit + retry, lihat telegram_queue.py)
+# =========================================================
+send_queue = TelegramSendQueue(
+    _post_message,
+    workers=int(os.getenv("TELEGRAM_QUEUE_WORKERS", "4")),
+    maxsize=int(os.getenv("TELEGRAM_QUEUE_MAX", "1000")),
+    global_rate=float(os.getenv("TELEGRAM_RATE_GLOBAL", "30")),
+    chat_rate=float(os.getenv("TELEGRAM_RATE_CHAT", "1")),
+    group_rate=float(os.getenv("TELEGRAM_RATE_GROUP_PER_MIN", "20")) / 60,
+    max_retries=int(os.getenv("TELEGRAM_MAX_RETRIES", "5")),
+)
+
+
+async def _deliver(messages: dict[str, Iterable[str]]) -> dict[str, DeliveryResult]:
+    if not os.getenv("TELEGRAM_BOT_TOKEN") or not messages:
+        logger.error("[TELEGRAM] Token/Chat ID kosong.")
+        return {}
+    return await fan_out(send_queue.send, messages)
+
+
+def _messages_by_destination(
+    header: str,
+    grouped: dict[str, list],
+    brand_items: Callable[[list], Iterable[str]],
+    footer: Callable[[list[str]], str] | None = None,
+    brand_separator: str = "",
+) -> dict[str, Iterator[str]]:
+    """chat -> chunk pesan; tiap chat hanya menerima brand miliknya (lihat
+    destinations.py). grouped: brand -> item, sudah urut brand."""
+    return {
+        chat: iter_message_chunks(
+            header,
+            ((brand, brand_items(grouped[brand])) for brand in brands),
+            footer=footer(brands) if footer else "",
+            brand_separator=brand_separator,
+        )
+        for chat, brands in destinations.plan(grouped).items()
+    }
+
+
+def _delivered_brands(brands: Iterable[str], results: dict[str, DeliveryResult]) -> set[str]:
+    # brand dianggap terkirim kalau semua chat pemiliknya sukses (mirror ops tidak dihitung)
+    ok = set()
+    for brand in brands:
+        owners = destinations.owners(brand)
+        if owners and all(c in results and results[c].ok for c in owners):
+            ok.add(brand)
+    return ok
 
 
 # =========================================================
 # FULL LIST / DAILY
 # =========================================================
-async def send_full_list_trigger(stage: str = "DAILY"):
-    db = SessionLocal()
-    try:
-        subs = get_all_subscriptions(db)
-        now_dt = datetime.now(timezone_wib)
-        today = now_dt.date()
-        now_str = now_dt.strftime("%d %B %Y - %H:%M WIB")
 
-        if not subs:
-            await send_telegram_message("<b>Our Hosting List</b>\n\nBelum ada subscription bro! 🚀")
-            return
 
-        grouped = defaultdict(list)
-        for sub in subs:
-            brand = (sub.brand or "Tanpa Brand").strip().upper()
-            grouped[brand].append(sub)
+def _record_matched(stage: str, n: int):
+    JOB_MATCHED.inc(n, stage=stage)
+    JOB_LAST_MATCHED.set(n, stage=stage)
 
-        msg = f"<b>Our Hosting List</b>\n{now_str}\n\n"
 
-        for brand, items in sorted(grouped.items()):
-            msg += f"<b>{html_escape(brand)}</b>\n"
-            for i, sub in enumerate(items, 1):
-                exp_date = _to_date(sub.expires_at)
-                days_left = (exp_date - today).days
+def full_list_messages(subs: list, now_dt: datetime) -> dict[str, Iterator[str]]:
+    """chat -> chunk "Our Hosting List" (dipakai job harian dan outbox /trigger)."""
+    if not subs:
+        text = "<b>Our Hosting List</b>\n\nBelum ada subscription bro! 🚀"
+        return {chat: iter([text]) for chat in destinations.chats_for(None)}
 
-                msg += f"{i}. <b>{html_escape(sub.name)}</b>\n"
-                if sub.url:
-                    safe_url = html_escape(sub.url)
-                    msg += f"🔗 <a href='{safe_url}'>{safe_url}</a>\n"
+    today = now_dt.date()
+    now_str = now_dt.strftime("%d %B %Y - %H:%M WIB")
+    grouped = defaultdict(list)
+    for sub in subs:
+        grouped[brand_key(sub.brand)].append(sub)
+    grouped = dict(sorted(grouped.items()))
 
-                remaining_text, emoji_override = _format_remaining(days_left)
-                emoji = emoji_override or _default_emoji(days_left)
-                msg += f"Expire: {exp_date.strftime('%d %B %Y')} {remaining_text} {emoji}\n\n"
+    def brand_items(items):
+        for i, sub in enumerate(items, 1):
+            exp_date = _to_date(sub.expires_at)
+            yield _format_item(i, sub.name, sub.url, exp_date, (exp_date - today).days)
 
-        msg += f"<b>TOTAL: {len(subs)} SUBSCRIPTION{'S' if len(subs)!=1 else ''}</b>"
+    def footer(brands):
+        # total per chat = subscription dari brand yang diterima chat itu
+        n = sum(len(grouped[b]) for b in brands)
+        return f"<b>TOTAL: {n} SUBSCRIPTION{'S' if n != 1 else ''}</b>"
 
-        ok_any = False
-        for ch in _chunks(msg):
-            ok_any = ok_any or await send_telegram_message(ch)
+    return _messages_by_destination(
+        f"<b>Our Hosting List</b>\n{now_str}\n\n", grouped, brand_items, footer=footer,
+    )
 
-        add_log(db, "INFO", f"Telegram full list sent ({stage}). ok={ok_any}")
 
-    except Exception as e:
-        add_log(db, "ERROR", f"Telegram full list error: {e}")
-    finally:
-        db.close()
+async def send_full_list_trigger(stage: str = "DAILY"):
+    start = time.perf_counter()
+    async with AsyncSessionLocal() as db:
+        try:
+            subs = await get_all_subscriptions(db)
+            _record_matched(stage, len(subs))
+            results = await _deliver(full_list_messages(subs, datetime.now(timezone_wib)))
+            ok = bool(results) and all(r.ok for r in results.values())
+
+            log_event("INFO", f"Telegram full list sent ({stage}). ok={ok} chats={summarize(results)}")
+
+        except Exception as e:
+            log_event("ERROR", f"Telegram full list error: {e}")
+        finally:
+            JOB_DURATION.observe(time.perf_counter() - start, stage=stage)
 
 
 async def send_daily_summary():
-    if not _allowed_minute({0}):
-        return
     await send_full_list_trigger(stage="DAILY")
 
 
 # =========================================================
 # REMINDER WINDOWS
 # =========================================================
-async def _send_filtered(target_days: list[int], title: str, stage: str):
-    db = SessionLocal()
-    try:
-        subs = get_all_subscriptions(db)
-        now_dt = datetime.now(timezone_wib)
-        today = now_dt.date()
-        now_str = now_dt.strftime("%d %B %Y - %H:%M WIB")
+# stage -> (days_left yang masuk window, judul pesan)
+REMINDER_STAGES = {
+    "H-3": ([3], "Reminder H-3 (3x sehari)"),
+    "H-2": ([2], "Reminder H-2 (6x sehari)"),
+    "H-1/EXPIRED": (
+        [1, 0, -1, -2, -3, -4, -5, -6, -7, -8, -9, -10],
+        "Reminder H-1 / Jatuh Tempo / Expired",
+    ),
+}
 
-        matched = []
-        for sub in subs:
-            exp_date = _to_date(sub.expires_at)
-            days_left = (exp_date - today).days
-            if days_left in target_days:
-                matched.append((sub, exp_date, days_left))
 
-        if not matched:
-            return
+async def _send_stage(db, stage: str, matched: list, now_str: str):
+    _record_matched(stage, len(matched))
+    if not matched:
+        return
 
+    title = REMINDER_STAGES[stage][1]
+    try:
         grouped = defaultdict(list)
         for sub, exp_date, days_left in matched:
-            brand = (sub.brand or "Tanpa Brand").strip().upper()
-            grouped[brand].append((sub, exp_date, days_left))
-
-        msg = f"<b>{html_escape(title)}</b>\n{now_str}\n\n"
+            grouped[brand_key(sub.brand)].append((sub, exp_date, days_left))
+        grouped = dict(sorted(grouped.items()))
 
-        for brand, items in sorted(grouped.items()):
-            msg += f"<b>{html_escape(brand)}</b>\n"
+        def brand_items(items):
             for i, (sub, exp_date, days_left) in enumerate(items, 1):
-                msg += f"{i}. <b>{html_escape(sub.name)}</b>\n"
-                if sub.url:
-                    safe_url = html_escape(sub.url)
-                    msg += f"🔗 <a href='{safe_url}'>{safe_url}</a>\n"
-
-                remaining_text, emoji_override = _format_remaining(days_left)
-                emoji = emoji_override or _default_emoji(days_left)
-                msg += f"Expire: {exp_date.strftime('%d %B %Y')} {remaining_text} {emoji}\n\n"
+                yield _format_item(i, sub.name, sub.url, exp_date, days_left)
 
-                set_last_notified(db, sub.id, stage)
+        results = await _deliver(_messages_by_destination(
+            f"<b>{html_escape(title)}</b>\n{now_str}\n\n", grouped, brand_items,
+            brand_separator="—" * 30 + "\n\n",
+        ))
+        delivered = _delivered_brands(grouped, results)
+        ok = len(delivered) == len(grouped)
 
-            msg += "—" * 30 + "\n\n"
+        # bookkeeping sekali per batch, hanya untuk brand yang pesannya benar-benar terkirim
+        ids_by_counter = defaultdict(list)
+        for brand in delivered:
+            for sub, _, days_left in grouped[brand]:
+                ids_by_counter[_reminder_counter(days_left)].append(sub.id)
+        if ids_by_counter:
+            await mark_notified(db, stage, ids_by_counter)
 
-        ok = await send_telegram_message(msg)
-        add_log(db, "INFO", f"Reminder sent stage={stage} ok={ok} count={len(matched)}")
+        log_event("INFO", f"Reminder sent stage={stage} ok={ok} count={len(matched)} chats={summarize(results)}")
 
     except Exception as e:
-        add_log(db, "ERROR", f"Reminder error stage={stage}: {e}")
-    finally:
-        db.close()
+        log_event("ERROR", f"Reminder error stage={stage}: {e}")
 
 
-async def send_reminders_3days():
-    if not _allowed_minute({0}):
-        return
-    await _send_filtered([3], "Reminder H-3 (3x sehari)", "H-3")
-
-
-async def send_reminders_2days():
-    if not _allowed_minute({0}):
-        return
-    await _send_filtered([2], "Reminder H-2 (6x sehari)", "H-2")
+async def send_reminders_for(stage_ids: dict[str, list[int]]):
+    """Kirim reminder untuk id yang sudah dipilih (dipanggil ReminderEngine)."""
+    async with AsyncSessionLocal() as db:
+        now_dt = datetime.now(timezone_wib)
+        today = now_dt.date()
+        now_str = now_dt.strftime("%d %B %Y - %H:%M WIB")
 
+        for stage, ids in stage_ids.items():
+            target_days = REMINDER_STAGES[stage][0]
+            # durasi dicatat di semua jalur, termasuk run kosong / gagal fetch
+            with JOB_DURATION.time(stage=stage):
+                try:
+                    subs = await get_subscriptions_by_ids(db, ids)
+                except Exception as e:
+                    log_event("ERROR", f"Reminder error stage={stage}: {e}")
+                    _record_matched(stage, 0)
+                    continue
+
+                matched = []
+                for sub in sorted(subs, key=lambda s: (s.expires_at, s.id)):
+                    exp_date = _to_date(sub.expires_at)
+                    days_left = (exp_date - today).days
+                    # cek ulang: bisa saja sudah di-archive / diperpanjang
+                    if not sub.is_archived and days_left in target_days:
+                        matched.append((sub, exp_date, days_left))
+                await _send_stage(db, stage, matched, now_str)
 
-async def send_reminders_1day_or_expired():
-    if not _allowed_minute({0, 30}):
-        return
-    await _send_filtered(
-        [1, 0, -1, -2, -3, -4, -5, -6, -7, -8, -9, -10],
-        "Reminder H-1 / Jatuh Tempo / Expired",
-        "H-1/EXPIRED",
-    )
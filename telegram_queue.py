@@ -0,0 +1,322 @@
+"""Antrian kirim Telegram dengan rate limit + retry.
+
+Batas Telegram Bot API (kurang lebih):
+- global  : ~30 pesan/detik per bot
+- per chat: ~1 pesan/detik
+- grup    : ~20 pesan/menit per grup (chat_id negatif)
+
+Tiap chat punya antrian sendiri; pesan ke chat yang sama dikirim
+berurutan. Worker mengambil chat yang siap dari ready queue. Kalau bucket
+chat itu belum punya token (limit grup, 429 `retry_after`, backoff 5xx),
+chat dijadwalkan ulang lewat timer dan worker lanjut ke chat lain, jadi
+satu chat yang tertahan tidak menahan pengiriman ke chat lain.
+429 ditunggu sesuai `retry_after`, error jaringan / 5xx pakai exponential
+backoff.
+"""
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SendResult:
+    ok: bool
+    status: int | None = None
+    retry_after: float | None = None
+    description: str | None = None
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def reserve(self) -> float:
+        """Ambil token tanpa menunggu: 0 = dapat, >0 = detik sampai ada token."""
+        now = time.monotonic()
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def block_for(self, seconds: float):
+        # dipakai saat Telegram balas 429 (retry_after)
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+@dataclass
+class _Item:
+    chat_id: str
+    text: str
+    enqueued_at: float = field(default_factory=time.monotonic)
+    future: asyncio.Future | None = None
+    attempts: int = 0
+
+
+class TelegramSendQueue:
+    def __init__(
+        self,
+        post: Callable[[str, str], Awaitable[SendResult]],
+        workers: int = 4,
+        maxsize: int = 1000,
+        global_rate: float = 30.0,
+        chat_rate: float = 1.0,
+        group_rate: float = 20 / 60,
+        max_retries: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+    ):
+        self._post = post
+        self._workers_n = workers
+        self._maxsize = maxsize
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        # chat ada di _chats <=> tepat satu "tiket" chat itu beredar: di
+        # _ready, di timer _delayed, atau sedang dipegang satu worker
+        self._chats: dict[str, deque[_Item]] = {}
+        self._ready: asyncio.Queue | None = None
+        self._delayed: dict[str, asyncio.TimerHandle] = {}
+        self._slots: asyncio.Semaphore | None = None
+        self._idle: asyncio.Event | None = None
+        self._workers: list[asyncio.Task] = []
+        self._global: TokenBucket | None = None
+        self._chat_buckets: dict[str, TokenBucket] = {}
+
+        self._stats = {
+            "sent": 0, "failed": 0, "retried": 0, "throttled": 0,
+            "latency_total": 0.0, "latency_max": 0.0, "latency_last": 0.0,
+        }
+        self._pending = 0
+        self._in_flight = 0
+
+    # ---------- lifecycle ----------
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    async def start(self):
+        if self.running:
+            return
+        self._ready = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self._maxsize)
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._global = TokenBucket(self.global_rate, self.global_rate)
+        self._chat_buckets.clear()
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"telegram-send-{i}")
+            for i in range(self._workers_n)
+        ]
+
+    async def stop(self, drain_timeout: float = 10.0):
+        if not self.running:
+            return
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"[TELEGRAM] queue stop: {self._pending} pesan belum terkirim")
+        for t in self._workers:
+            t.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        for handle in self._delayed.values():
+            handle.cancel()
+        self._delayed.clear()
+
+        # pesan yang tersisa dianggap gagal, jangan biarkan caller menunggu selamanya
+        for items in self._chats.values():
+            for item in items:
+                if item.future and not item.future.done():
+                    item.future.set_result(False)
+        self._chats.clear()
+        self._pending = 0
+
+    # ---------- API ----------
+    async def send(self, chat_id: str, text: str) -> bool:
+        item = _Item(chat_id=str(chat_id), text=text)
+        if not self.running:
+            # di luar lifespan (script / test): kirim langsung, tetap pakai retry
+            if self._global is None:
+                self._global = TokenBucket(self.global_rate, self.global_rate)
+            return await self._deliver(item)
+
+        await self._slots.acquire()
+        item.future = asyncio.get_running_loop().create_future()
+        items = self._chats.get(item.chat_id)
+        if items is None:
+            self._chats[item.chat_id] = deque([item])
+            self._ready.put_nowait(item.chat_id)
+        else:
+            items.append(item)
+        self._pending += 1
+        self._idle.clear()
+        return await item.future
+
+    def stats(self) -> dict:
+        done = self._stats["sent"] + self._stats["failed"]
+        return {
+            "running": self.running,
+            "depth": self._pending - self._in_flight,
+            "in_flight": self._in_flight,
+            "chats_waiting": len(self._delayed),
+            "sent": self._stats["sent"],
+            "failed": self._stats["failed"],
+            "retried": self._stats["retried"],
+            "throttled_429": self._stats["throttled"],
+            "latency_avg_s": round(self._stats["latency_total"] / done, 3) if done else 0.0,
+            "latency_max_s": round(self._stats["latency_max"], 3),
+            "latency_last_s": round(self._stats["latency_last"], 3),
+        }
+
+    # ---------- internals ----------
+    def _bucket_for(self, chat_id: str) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            is_group = chat_id.startswith("-")
+            rate = self.group_rate if is_group else self.chat_rate
+            bucket = TokenBucket(rate, 3 if is_group else 1)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    def _backoff(self, attempt: int) -> float:
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return delay * (0.5 + random.random() / 2)
+
+    def _schedule(self, chat_id: str, delay: float):
+        # chat belum boleh kirim: kembali ke ready queue setelah `delay`
+        self._delayed[chat_id] = asyncio.get_running_loop().call_later(
+            delay, self._wake_chat, chat_id)
+
+    def _wake_chat(self, chat_id: str):
+        self._delayed.pop(chat_id, None)
+        self._ready.put_nowait(chat_id)
+
+    async def _worker(self):
+        while True:
+            chat_id = await self._ready.get()
+            items = self._chats[chat_id]
+            item = items[0]
+            bucket = self._bucket_for(chat_id)
+            wait = bucket.reserve()
+            if wait > 0:
+                self._schedule(chat_id, wait)
+                continue
+            try:
+                await self._global.acquire()
+                ok = await self._attempt(item, bucket)
+            except asyncio.CancelledError:
+                raise   # item masih di antrian chat, digagalkan oleh stop()
+            except Exception as e:
+                logger.error(f"[TELEGRAM] queue worker error: {e}")
+                ok = False
+            if ok is None:
+                # bucket chat sedang diblok -> reserve() berikutnya menjadwalkan ulang
+                self._ready.put_nowait(chat_id)
+                continue
+
+            items.popleft()
+            self._finish(item, ok)
+            if items:
+                self._ready.put_nowait(chat_id)
+            else:
+                del self._chats[chat_id]
+
+    async def _deliver(self, item: _Item) -> bool:
+        # jalur langsung (queue tidak jalan): tunggu bucket di tempat
+        chat_bucket = self._bucket_for(item.chat_id)
+        while True:
+            await self._global.acquire()
+            await chat_bucket.acquire()
+            ok = await self._attempt(item, chat_bucket)
+            if ok is not None:
+                self._record(item, ok)
+                return ok
+
+    async def _attempt(self, item: _Item, chat_bucket: TokenBucket) -> bool | None:
+        """Satu kali kirim. True/False = selesai; None = retry nanti (bucket
+        chat sudah diblok selama waktu tunggunya)."""
+        attempt = item.attempts
+        item.attempts += 1
+        self._in_flight += 1
+        try:
+            try:
+                res = await self._post(item.chat_id, item.text)
+            except Exception as e:
+                res = SendResult(ok=False, description=str(e))
+        finally:
+            self._in_flight -= 1
+
+        if res.ok:
+            return True
+
+        if res.status == 429:
+            self._stats["throttled"] += 1
+            wait = res.retry_after or self._backoff(attempt)
+            logger.warning(f"[TELEGRAM] 429 chat={item.chat_id}, retry_after={wait}s")
+        elif res.status is None or res.status >= 500:
+            wait = self._backoff(attempt)
+            logger.warning(f"[TELEGRAM] Error {res.status}: {res.description} (retry {wait:.1f}s)")
+        else:
+            # 400/403 dst: retry tidak akan membantu (HTML invalid, bot di-kick, ...)
+            logger.error(f"[TELEGRAM] Error {res.status}: {res.description}")
+            return False
+
+        if attempt >= self.max_retries:
+            logger.error(f"[TELEGRAM] gagal setelah {self.max_retries} retry chat={item.chat_id}")
+            return False
+
+        self._stats["retried"] += 1
+        # pesan berikutnya ke chat ini juga harus menunggu (urutan per chat)
+        chat_bucket.block_for(wait)
+        return None
+
+    def _finish(self, item: _Item, ok: bool):
+        self._record(item, ok)
+        if item.future and not item.future.done():
+            item.future.set_result(ok)
+        self._slots.release()
+        self._pending -= 1
+        if self._pending == 0:
+            self._idle.set()
+
+    def _record(self, item: _Item, ok: bool):
+        latency = time.monotonic() - item.enqueued_at
+        self._stats["sent" if ok else "failed"] += 1
+        self._stats["latency_total"] += latency
+        self._stats["latency_max"] = max(self._stats["latency_max"], latency)
+        self._stats["latency_last"] = latency
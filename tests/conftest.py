@@ -0,0 +1,36 @@
+import asyncio
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.chdir(ROOT)   # StaticFiles / Jinja2Templates pakai path relatif
+
+# database.py / telegram_bot.py membaca env saat import. Sengaja ditimpa (bukan
+# setdefault): pytest dari shell produksi tidak boleh kena DB / bot asli.
+_DB_DIR = tempfile.mkdtemp(prefix="rdr-test-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_DB_DIR}/test.db"
+os.environ.pop("DATABASE_REPLICA_URLS", None)
+os.environ["SESSION_SECRET"] = "test-secret"
+os.environ.pop("TELEGRAM_BOT_TOKEN", None)
+os.environ["TELEGRAM_API_BASE"] = "http://telegram.invalid"
+os.environ["TELEGRAM_CHAT_ID"] = "1001"
+os.environ.pop("TELEGRAM_OPS_CHAT_ID", None)
+os.environ.pop("TELEGRAM_BRAND_CHATS", None)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def schema():
+    # tabel dibuat sekali; tiap test boleh jalan sendiri tanpa TestClient
+    from database import async_engine
+    from migrations import run_migrations
+
+    async def migrate():
+        await run_migrations(async_engine)
+        await async_engine.dispose()
+
+    asyncio.run(migrate())
@@ -0,0 +1,22 @@
+from cache import KeyedCache
+
+
+def test_page_cache_keeps_only_latest_version_per_user():
+    cache = KeyedCache(maxsize=8, group=lambda key: key[-1])
+    for version in range(5):
+        cache.set(((version,), "2026-01-01", "admin"), f"v{version}")
+    cache.set(((4,), "2026-01-01", "ops"), "ops")
+
+    assert cache.stats()["size"] == 2
+    assert cache.get(((4,), "2026-01-01", "admin")) == "v4"
+    assert cache.get(((3,), "2026-01-01", "admin")) is None
+    assert cache.get(((4,), "2026-01-01", "ops")) == "ops"
+
+
+def test_maxsize_still_bounds_distinct_groups():
+    cache = KeyedCache(maxsize=2, group=lambda key: key[-1])
+    for user in ("a", "b", "c"):
+        cache.set((1, user), user)
+
+    assert cache.stats()["size"] == 2
+    assert cache.get((1, "a")) is None
@@ -0,0 +1,50 @@
+import asyncio
+import json
+
+import crud
+from cluster import ChangeBus, LeaderElector
+from database import async_engine
+from migrations import run_migrations
+
+
+async def _noop():
+    pass
+
+
+def test_sqlite_leader_lock_is_exclusive():
+    async def scenario():
+        a = LeaderElector(async_engine, _noop, _noop)
+        b = LeaderElector(async_engine, _noop, _noop)
+        assert await a._try_acquire()
+        assert not await b._try_acquire()
+        a.is_leader = True
+        await a._step_down(release=True)
+        assert await b._try_acquire()
+        await b._step_down(release=True)
+
+    asyncio.run(scenario())
+
+
+def test_sqlite_change_bus_delivers_events_from_other_workers(monkeypatch):
+    monkeypatch.setattr("cluster.CHANGE_POLL_INTERVAL", 0.05)
+    seen = []
+
+    async def scenario():
+        await run_migrations(async_engine)
+        bus = ChangeBus(async_engine)
+        listener = crud.on_change(lambda table, ids: seen.append((table, ids)))
+        try:
+            assert bus.enabled
+            bus.start()
+            await asyncio.sleep(0.1)
+            # event dari worker lain (WORKER_ID beda) ditulis langsung ke tabel
+            await bus._publish(json.dumps({"w": "other:1", "t": "subscription", "ids": [7]}))
+            await asyncio.sleep(0.3)
+        finally:
+            crud._change_listeners.remove(listener)
+            crud._change_listeners.remove(bus.publish)
+            await bus.stop()
+            await async_engine.dispose()
+
+    asyncio.run(scenario())
+    assert ("subscription", [7]) in seen
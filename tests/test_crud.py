@@ -0,0 +1,35 @@
+from datetime import date
+
+from sqlalchemy import event
+
+import crud
+from crud import create_subscription, get_subscriptions_by_ids, mark_notified
+from database import SessionLocal, engine
+from schemas import SubscriptionCreate
+
+
+def test_mark_notified_batches_large_stages(monkeypatch):
+    monkeypatch.setattr(crud, "BULK_ID_BATCH", 2)
+    with SessionLocal() as db:
+        ids = [create_subscription(db, SubscriptionCreate(
+            name=f"Notify {i}", url="https://notify.example", brand="RDR", expires_at=date(2041, 1, 1),
+        )).id for i in range(5)]
+
+        updates = []
+
+        def count_updates(conn, cursor, statement, params, context, executemany):
+            if statement.startswith("UPDATE subscription"):
+                updates.append(params)
+
+        event.listen(engine, "before_cursor_execute", count_updates)
+        try:
+            n = mark_notified(db, "H-1/EXPIRED", {"reminder_count_h1": ids[:3], "reminder_count_h0": ids[3:]})
+        finally:
+            event.remove(engine, "before_cursor_execute", count_updates)
+        subs = {s.id: s for s in get_subscriptions_by_ids(db, ids)}
+
+    assert n == 5
+    assert len(updates) == 3   # h1: 2 + 1 id, h0: 2 id
+    assert [subs[i].reminder_count_h1 for i in ids] == [1, 1, 1, 0, 0]
+    assert [subs[i].reminder_count_h0 for i in ids] == [0, 0, 0, 1, 1]
+    assert {subs[i].last_notified_stage for i in ids} == {"H-1/EXPIRED"}
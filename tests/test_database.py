@@ -0,0 +1,12 @@
+from database import _pool_for
+
+POOL = {"pool_size": 5, "max_overflow": 10, "pool_timeout": 30}
+
+
+def test_pool_options_only_for_queue_pool():
+    assert _pool_for("sqlite://", POOL) == {}
+    assert _pool_for("sqlite:///:memory:", POOL) == {}
+    assert _pool_for("sqlite+aiosqlite://", POOL) == {}
+    assert _pool_for("sqlite:///rdr.db", POOL) == POOL
+    assert _pool_for("sqlite+aiosqlite:///rdr.db", POOL) == POOL
+    assert _pool_for("postgresql+psycopg://u@localhost/rdr", POOL) == POOL
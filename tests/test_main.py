@@ -0,0 +1,105 @@
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(main.app) as c:
+        c.portal.call(main.stop_jobs)   # scheduler tidak perlu jalan selama test
+        c.portal.call(main.outbox_dispatcher.stop)   # outbox diperiksa, tidak dikirim
+        r = c.post("/login", data={
+            "username": os.getenv("ADMIN_USERNAME", "adminrdr"),
+            "password": os.getenv("ADMIN_PASSWORD", "j3las_kuat39!"),
+        }, follow_redirects=False)
+        assert r.status_code == 303
+        yield c
+
+
+def _active_ids(client) -> set[int]:
+    r = client.get("/subscriptions/", params={"limit": 500})
+    assert r.status_code == 200
+    return {item["id"] for item in r.json()["items"]}
+
+
+@pytest.mark.parametrize("action", ["delete", "archive", "renew"])
+def test_bulk_by_filter_rejects_status_all_alone(client, action):
+    client.post("/add", data={"name": "Keep me", "url": "https://keep.example",
+                              "brand": "RDR", "expires_at": "01/31/2030"})
+    before = _active_ids(client)
+    assert before
+
+    r = client.post(f"/bulk/by-filter/{action}", params={"status": "all", "days": 30})
+
+    assert r.status_code == 400
+    assert _active_ids(client) == before
+
+
+def test_bulk_by_filter_status_all_with_brand_is_allowed(client):
+    r = client.post("/bulk/by-filter/archive", params={"status": "all", "brand": "NO-SUCH-BRAND"})
+
+    assert r.status_code == 200
+    assert r.json() == {"action": "archive", "affected": 0}
+
+
+def test_touch_heartbeat_upserts(client):
+    from crud import get_heartbeats, touch_heartbeat
+    from database import SessionLocal
+
+    with SessionLocal() as db:
+        touch_heartbeat(db, "test_job", "w1")
+        touch_heartbeat(db, "test_job", "w2", "error")
+        rows = [hb for hb in get_heartbeats(db) if hb.name == "test_job"]
+
+    assert [(hb.worker, hb.status) for hb in rows] == [("w2", "error")]
+
+
+def test_repeated_renewal_is_announced_each_time(client):
+    from database import SessionLocal
+    from models import OutboxMessage, Subscription
+
+    client.post("/add", data={"name": "Renew me", "url": "https://renew.example",
+                              "brand": "RDR", "expires_at": "01/01/2030"})
+    with SessionLocal() as db:
+        sub_id = db.query(Subscription.id).filter(Subscription.name == "Renew me").scalar()
+
+    def set_expiry(expires_at):
+        r = client.post(f"/update/{sub_id}", data={"name": "Renew me", "url": "https://renew.example",
+                                                   "brand": "RDR", "expires_at": expires_at},
+                        follow_redirects=False)
+        assert r.status_code == 303
+
+    set_expiry("01/01/2031")   # renew A -> B
+    set_expiry("01/01/2030")   # undo B -> A (bukan renew)
+    set_expiry("01/01/2031")   # renew A -> B lagi
+
+    with SessionLocal() as db:
+        keys = [k for (k,) in db.query(OutboxMessage.idempotency_key)
+                if k.startswith(f"renew:{sub_id}:")]
+    assert keys and len(keys) == 2 * len(main.destinations.chats_for("RDR"))
+
+
+def test_blank_brand_groups_the_same_in_sql_and_python(client):
+    from sqlalchemy import select
+
+    import crud
+    from database import SessionLocal
+    from models import Subscription
+
+    for brand in ("", "   "):
+        client.post("/add", data={"name": "No brand", "url": "https://blank.example",
+                                  "brand": brand, "expires_at": "06/01/2035"})
+    with SessionLocal() as db:
+        # import / data lama bisa menyimpan brand berisi spasi saja
+        db.query(Subscription).filter(Subscription.name == "No brand").update({"brand": "  "})
+        db.commit()
+        rows = db.execute(select(Subscription.brand, crud.brand_key_expr())
+                          .where(Subscription.name == "No brand")).all()
+
+    assert rows
+    assert all(key == crud.brand_key(brand) == "TANPA BRAND" for brand, key in rows)
+    r = client.get("/subscriptions/", params={"brand": "Tanpa Brand", "limit": 500})
+    assert {"No brand"} <= {item["name"] for item in r.json()["items"]}
@@ -0,0 +1,107 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import outbox
+from crud_async import claim_outbox, enqueue_outbox
+from database import AsyncSessionLocal, async_engine
+from migrations import run_migrations
+from models import OutboxMessage
+from outbox import OutboxDispatcher
+
+
+def _run(coro):
+    async def wrapper():
+        await run_migrations(async_engine)
+        try:
+            return await coro
+        finally:
+            await async_engine.dispose()
+    return asyncio.run(wrapper())
+
+
+def test_lease_is_renewed_per_message(monkeypatch):
+    sent, stolen = [], []
+
+    async def slow_send(chat_id, text):
+        # tiap kirim lebih lama dari separuh lease; total batch > lease
+        await asyncio.sleep(0.3)
+        async with AsyncSessionLocal() as db:
+            now = datetime.utcnow()
+            stolen.extend(await claim_outbox(db, now, 50, now + timedelta(seconds=60)))
+        sent.append((chat_id, text))
+        return True
+
+    monkeypatch.setattr(outbox.send_queue, "send", slow_send)
+
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            await enqueue_outbox(db, [
+                {"idempotency_key": f"lease-test:{i}", "chat_id": "-100", "text": f"m{i}"}
+                for i in range(4)
+            ], commit=True)
+        return await OutboxDispatcher(lease_seconds=0.5).drain()
+
+    _run(scenario())
+    assert [t for c, t in sent if c == "-100"] == ["m0", "m1", "m2", "m3"]
+    assert [r for r in stolen if r.chat_id == "-100"] == []
+
+
+def test_lost_lease_stops_sending(monkeypatch):
+    sent = []
+
+    async def send(chat_id, text):
+        # lease habis dan diambil worker lain setelah pesan pertama
+        async with AsyncSessionLocal() as db:
+            await db.run_sync(lambda s: (
+                s.query(OutboxMessage)
+                .filter(OutboxMessage.idempotency_key.like("lost-test:%"),
+                        OutboxMessage.status == "sending")
+                .update({"locked_until": datetime.utcnow() + timedelta(hours=1)}),
+                s.commit(),
+            ))
+        sent.append((chat_id, text))
+        return True
+
+    monkeypatch.setattr(outbox.send_queue, "send", send)
+
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            await enqueue_outbox(db, [
+                {"idempotency_key": f"lost-test:{i}", "chat_id": "-200", "text": f"m{i}"}
+                for i in range(3)
+            ], commit=True)
+        return await OutboxDispatcher().drain()
+
+    _run(scenario())
+    assert [t for c, t in sent if c == "-200"] == ["m0"]
+
+
+def test_concurrent_claims_never_share_a_row():
+    from sqlalchemy import event
+
+    from crud import claim_outbox as claim_sync, enqueue_outbox as enqueue_sync
+    from database import SessionLocal
+
+    _run(asyncio.sleep(0))   # migrasi
+    with SessionLocal() as db:
+        enqueue_sync(db, [{"idempotency_key": f"race-test:{i}", "chat_id": "-300", "text": f"m{i}"}
+                          for i in range(3)], commit=True)
+    now = datetime.utcnow()
+
+    with SessionLocal() as a, SessionLocal() as b:
+        won_by_b = []
+
+        @event.listens_for(a, "do_orm_execute")
+        def interleave(state):
+            # worker B claim tepat setelah SELECT kandidat worker A selesai
+            if state.is_select and not won_by_b:
+                selected = state.invoke_statement().freeze()
+                won_by_b.extend(claim_sync(b, now, 50, now + timedelta(seconds=60)))
+                return selected()
+
+        won_by_a = claim_sync(a, now, 50, now + timedelta(seconds=30))
+        ids_a = {r.id for r in won_by_a if r.chat_id == "-300"}
+        ids_b = {r.id for r in won_by_b if r.chat_id == "-300"}
+
+    assert len(ids_a | ids_b) == 3
+    assert not ids_a & ids_b
@@ -0,0 +1,75 @@
+import asyncio
+from datetime import date, datetime
+
+from crud import create_subscription
+from database import SessionLocal, async_engine
+from migrations import run_migrations
+from reminder_engine import ReminderEngine, timezone_wib
+from scheduler_logic import default_tiers
+from schemas import SubscriptionCreate
+from telegram_bot import REMINDER_STAGES
+
+# jauh di depan supaya tidak bercampur dengan data test lain
+MIDNIGHT = datetime(2040, 3, 10, tzinfo=timezone_wib)
+
+
+async def _noop(stage_ids, now):
+    pass
+
+
+def _engine() -> ReminderEngine:
+    return ReminderEngine(
+        [t for t in default_tiers() if t.stage in REMINDER_STAGES],
+        {stage: days for stage, (days, _) in REMINDER_STAGES.items()},
+        _noop,
+        misfire_grace=300,
+    )
+
+
+def _sub_expiring(expires_at: date) -> int:
+    with SessionLocal() as db:
+        return create_subscription(db, SubscriptionCreate(
+            name="Engine test", url="https://engine.example", brand="RDR", expires_at=expires_at,
+        )).id
+
+
+def _ticks(engine: ReminderEngine, *times: datetime) -> list[dict]:
+    async def scenario():
+        await run_migrations(async_engine)
+        try:
+            return [await engine._tick(t) for t in times]
+        finally:
+            await async_engine.dispose()
+    return asyncio.run(scenario())
+
+
+def test_midnight_rollover_fires_0000_slot():
+    # H-2 di hari MIDNIGHT, slot pertama 00:00
+    sub_id = _sub_expiring(date(2040, 3, 12))
+    engine = _engine()
+
+    before, at_midnight = _ticks(engine, MIDNIGHT.replace(day=9, hour=23, minute=50),
+                                 MIDNIGHT.replace(second=1))
+
+    assert sub_id not in before.get("H-2", [])
+    assert sub_id in at_midnight.get("H-2", [])
+
+
+def test_restart_within_misfire_grace_fires_missed_slot_once():
+    sub_id = _sub_expiring(date(2040, 3, 11))   # H-1, slot tiap 30 menit
+    engine = _engine()
+
+    first, again = _ticks(engine, MIDNIGHT.replace(minute=3), MIDNIGHT.replace(minute=4))
+
+    assert first.get("H-1/EXPIRED", []).count(sub_id) == 1
+    assert sub_id not in again.get("H-1/EXPIRED", [])
+
+
+def test_restart_after_misfire_grace_skips_to_next_slot():
+    sub_id = _sub_expiring(date(2040, 3, 12))   # H-2: 00:00, 04:00, ...
+    engine = _engine()
+
+    late, next_slot = _ticks(engine, MIDNIGHT.replace(minute=10), MIDNIGHT.replace(hour=4))
+
+    assert sub_id not in late.get("H-2", [])
+    assert sub_id in next_slot.get("H-2", [])
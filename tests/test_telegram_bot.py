@@ -0,0 +1,65 @@
+import asyncio
+import re
+
+from metrics import JOB_DURATION, JOB_LAST_MATCHED
+from telegram_bot import iter_message_chunks, send_reminders_for
+
+TELEGRAM_HARD_LIMIT = 4096
+
+
+def _balanced(chunk: str) -> bool:
+    stack = []
+    for m in re.finditer(r"<(/?)(\w+)[^>]*>", chunk):
+        closing, name = m.groups()
+        if closing:
+            if not stack or stack.pop() != name:
+                return False
+        else:
+            stack.append(name)
+    return not stack
+
+
+def test_item_over_telegram_limit_is_split():
+    name = "z" * 5000
+    item = (f"1. <b>{name}</b>\n"
+            f"🔗 <a href='https://rdr.example'>https://rdr.example?a=1&amp;b=2</a>\n\n")
+    chunks = list(iter_message_chunks("<b>Our Hosting List</b>\n\n", [("RDR", [item])],
+                                      footer="<b>TOTAL: 1 SUBSCRIPTION</b>"))
+
+    assert len(chunks) > 1
+    assert all(len(c) <= 3500 < TELEGRAM_HARD_LIMIT for c in chunks)
+    assert all(_balanced(c) for c in chunks)
+    joined = "".join(chunks)
+    assert joined.count("z") == 5000
+    assert "&amp;" in joined
+    assert joined.endswith("<b>TOTAL: 1 SUBSCRIPTION</b>")
+
+
+def test_split_never_cuts_inside_tag_or_entity():
+    item = "<b>" + "&amp;" * 40 + "</b>" + "<a href='https://x.example'>" + "y" * 30 + "</a>"
+    chunks = list(iter_message_chunks("", [("B", [item])], limit=64))
+
+    assert all(len(c) <= 64 for c in chunks)
+    for c in chunks:
+        assert _balanced(c)
+        assert not re.search(r"&[#\w]*$|<[^>]*$", c)   # tidak berakhir di tengah entity / tag
+    assert "".join(chunks).count("&amp;") == 40
+
+
+def test_short_items_stay_whole():
+    items = [f"{i}. <b>item {i}</b>\n" for i in range(1, 50)]
+    chunks = list(iter_message_chunks("H\n", [("B", items)], limit=200))
+
+    assert all(len(c) <= 200 for c in chunks)
+    for item in items:
+        assert any(item in c for c in chunks)
+
+
+def test_empty_stage_still_records_duration_and_zero_matched():
+    JOB_LAST_MATCHED.set(7, stage="H-3")
+    before = JOB_DURATION._values.get(("H-3",), [None, 0.0, 0])[2]
+
+    asyncio.run(send_reminders_for({"H-3": [987654321]}))
+
+    assert JOB_DURATION._values[("H-3",)][2] == before + 1
+    assert JOB_LAST_MATCHED._values[("H-3",)] == 0